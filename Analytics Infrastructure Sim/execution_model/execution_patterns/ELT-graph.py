@@ -7,6 +7,9 @@ import typing as tp
 import asyncio, os, yaml  
 from pathlib import Path
 
+from op_metrics import OpTimer
+import op_cache
+
 ## Define functions and configs
 
 dlog = dag.get_dagster_logger()
@@ -37,6 +40,8 @@ async def load_task(tlog):
     return tlog
 
 async def compute_task(tlog):
+    # simulated: a real CPU step here would block the op's event loop, so send it to a process pool instead,
+    # e.g. await loop.run_in_executor(pool, fn, tlog) or a cpu_bound Stage (Python Implementations/hybrid_executor.py)
     t = round(5 + tlog['n'] * max(0.5, gauss(mu=1, sigma=1)))
     await asyncio.sleep(t)
     tlog['cpu'] = t
@@ -100,10 +105,17 @@ async def ext(context: dag.OpExecutionContext):
     id = context.op_handle
     n=n_custom
     dlog.info(f"start {id}")
-    t = round(5 + max(0, gauss(mu=n, sigma=3)))
-    await asyncio.sleep(t)
-    dlog.info(f"finished {id}")
-    return dag.Nothing
+    with OpTimer(context) as rec:
+        key = op_cache.cache_key(str(id), config=dict(kind='ext', n=n))
+        out = op_cache.load(key)
+        rec.update(cache_key=key, cached=(out is not None))
+        if out is None:
+            t = round(5 + max(0, gauss(mu=n, sigma=3)))
+            await asyncio.sleep(t)
+            out = op_cache.store(key, dict(t=t))
+        rec['output'] = out
+    dlog.info(f"{'skipped (cached)' if rec['cached'] else 'finished'} {id}")
+    return rec
 
 @dag.op(tags={'resource_queue': 'loading_queue'})
 async def ld(context: dag.OpExecutionContext, dep: tp.List):
@@ -113,10 +125,17 @@ async def ld(context: dag.OpExecutionContext, dep: tp.List):
     id = context.op_handle
     n=n_custom * len(dep) 
     dlog.info(f"start {id}")
-    t = round(3 + n * (0.6 + 0.5*random()))
-    await asyncio.sleep(t)
-    dlog.info(f"finished {id}")
-    return dag.Nothing
+    with OpTimer(context, dep) as rec:
+        key = op_cache.cache_key(str(id), config=dict(kind='ld', n=n), dep=dep)
+        out = op_cache.load(key)
+        rec.update(cache_key=key, cached=(out is not None))
+        if out is None:
+            t = round(3 + n * (0.6 + 0.5*random()))
+            await asyncio.sleep(t)
+            out = op_cache.store(key, dict(t=t))
+        rec['output'] = out
+    dlog.info(f"{'skipped (cached)' if rec['cached'] else 'finished'} {id}")
+    return rec
 
 @dag.op(tags={'resource_queue': 'compute_queue'})
 async def comp(context: dag.OpExecutionContext, dep: tp.List):
@@ -126,10 +145,17 @@ async def comp(context: dag.OpExecutionContext, dep: tp.List):
     id = context.op_handle
     n=n_custom
     dlog.info(f"start {id}")
-    t = round(1 + n * max(0.7, gauss(mu=1.5, sigma=1)))
-    await asyncio.sleep(t)
-    dlog.info(f"finished {id}")
-    return dag.Nothing
+    with OpTimer(context, dep) as rec:
+        key = op_cache.cache_key(str(id), config=dict(kind='comp', n=n), dep=dep)
+        out = op_cache.load(key)
+        rec.update(cache_key=key, cached=(out is not None))
+        if out is None:
+            t = round(1 + n * max(0.7, gauss(mu=1.5, sigma=1)))
+            await asyncio.sleep(t)
+            out = op_cache.store(key, dict(t=t))
+        rec['output'] = out
+    dlog.info(f"{'skipped (cached)' if rec['cached'] else 'finished'} {id}")
+    return rec
 
 
 
@@ -173,6 +199,7 @@ def ELT_pipeline_workflow():
     '''
     Simulated Extract-Transform-Load pipeline workflow
     (14 extract * ())
+    ops are memoized (op_cache.py): a rerun only executes ops downstream of a source whose version changed in source_versions.yaml
     '''
     landing_data = ld.alias('loading_landing')(
         [ ext.alias('extract_sales_mapping')(), 
@@ -0,0 +1,82 @@
+"""
+Content-hash memoization of dagster ops against a local artifact store
+
+an op's cache key hashes its name, its config, and the cache keys of its upstream ops
+extract ops have no upstream, so their key hashes the version of their source instead (see source_versions.yaml)
+when a source changes, the keys of its extract op and everything downstream of it change; every other op finds its stored output and skips the work
+
+ops without a known version (no manifest entry, or an upstream that could not be keyed) always execute
+"""
+import hashlib, json, os, time, yaml
+import typing as tp
+
+from op_metrics import upstream_records
+
+
+artifact_dir = os.environ.get('ELT_ARTIFACT_DIR', 'op_artifacts/')
+source_manifest = os.environ.get('ELT_SOURCE_MANIFEST', 'source_versions.yaml')
+cache_enabled = os.environ.get('ELT_OP_CACHE', '1') != '0'
+
+
+def source_version(op_name: str, manifest=None) -> tp.Optional[str]:
+    """
+    version of the source behind an extract op, from the manifest
+        extract_sales_actuals: 2023-04-01       # explicit version token
+        extract_seed_dates: seeds/dates.csv     # file, versioned by size and modified time
+    """
+    manifest = manifest or source_manifest
+    if not os.path.exists(manifest):
+        return None
+    with open(manifest, 'r', encoding='utf8') as f:
+        versions = yaml.safe_load(f) or dict()
+    src = versions.get(op_name)
+    if src is None:
+        return None
+    src = str(src)
+    if os.path.exists(src):
+        stat = os.stat(src)
+        return f"{stat.st_size}-{stat.st_mtime_ns}"
+    return src
+
+
+def cache_key(op_name: str, config: dict, dep=None) -> tp.Optional[str]:
+    if not cache_enabled:
+        return None
+    upstream = upstream_records(dep)
+    if len(upstream) < len(dep or []):
+        return None # an input that is not an op record has no version
+    input_keys = sorted(u.get('cache_key') for u in upstream)
+    if None in input_keys:
+        return None
+    if dep is None:
+        source = source_version(op_name)
+        if source is None:
+            return None
+    else:
+        source = None
+    spec = dict(op=op_name, config=config, inputs=input_keys, source=source)
+    return hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode('utf8')).hexdigest()
+
+
+def _artifact_path(key):
+    return os.path.join(artifact_dir, key[:2], key + '.json')
+
+
+def load(key) -> tp.Optional[dict]:
+    if key is None or not os.path.exists(_artifact_path(key)):
+        return None
+    with open(_artifact_path(key), 'r', encoding='utf8') as f:
+        return json.load(f)['output']
+
+
+def store(key, output: dict) -> dict:
+    if key is None:
+        return output
+    path = _artifact_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # write-then-rename so a concurrent reader never sees a partial artifact
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf8') as f:
+        json.dump(dict(stored=time.time(), output=output), f)
+    os.replace(tmp_path, path)
+    return output
@@ -0,0 +1,124 @@
+"""
+Per-op performance instrumentation for the dagster execution patterns
+
+each instrumented op appends one record to a local time-series log (hive-partitioned Parquet, one file per op per run)
+    run_id, job_name, op, upstream, ready/start/end timestamps, queue_wait_s, exec_s, peak_rss_mb, rss_growth_mb,
+    bytes_read, bytes_written
+
+ops pass their record downstream as their output, so the next op knows which upstream ops it waited on and when they finished
+see perf_report.py to compare runs and attribute the critical path
+"""
+import pyarrow as pa
+import pyarrow.parquet as pq
+import os, sys, time
+import typing as tp
+
+from utilities import DataPipe
+
+
+perf_log_dir = os.environ.get('ELT_PERF_LOG_DIR', 'perf_logs/')
+
+perf_schema = pa.schema([
+    ('run_id', pa.string()),
+    ('job_name', pa.string()),
+    ('op', pa.string()),
+    ('upstream', pa.list_(pa.string())),
+    ('ready_ts', pa.float64()), # latest end_ts of upstream ops, null for root ops
+    ('start_ts', pa.float64()),
+    ('end_ts', pa.float64()),
+    ('queue_wait_s', pa.float64()), # start_ts - ready_ts
+    ('exec_s', pa.float64()),
+    ('peak_rss_mb', pa.float64()), # process-wide high-water mark at op end: includes earlier ops under in_process_executor
+    ('rss_growth_mb', pa.float64()), # how far the op raised that high-water mark: the op's own peak beyond what came before
+    ('bytes_read', pa.int64()),
+    ('bytes_written', pa.int64()),
+    ('cached', pa.bool_()), # output reused from op_cache, work skipped
+])
+
+
+def peak_rss_mb():
+    """
+    peak resident set size of the current process so far, in MB
+    the multiprocess executor runs each op in its own process, so there it is the op's peak;
+    under in_process_executor every op shares the process and this is the running peak of all ops so far
+    """
+    try:
+        import resource # unix only
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # linux reports KB, macOS reports bytes
+        return peak / (2**20 if sys.platform == 'darwin' else 2**10)
+    except ImportError:
+        pass
+    try:
+        import psutil # windows
+        return psutil.Process().memory_info().peak_wset / 2**20
+    except (ImportError, AttributeError):
+        return None
+
+
+def upstream_records(dep) -> tp.List[dict]:
+    """
+    keep only the upstream outputs that are op records, ignoring dag.Nothing and other values
+    """
+    return [d for d in (dep or []) if isinstance(d, dict) and 'op' in d]
+
+
+class OpTimer:
+    """
+    context manager wrapping the body of an op
+
+    with OpTimer(context, dep) as rec:
+        ... do work ...
+    return rec
+    """
+    def __init__(self, context, dep=None, log_dir=None):
+        self.context = context
+        self.upstream = upstream_records(dep)
+        self.log_dir = log_dir or perf_log_dir
+        self.record = dict()
+
+    def __enter__(self):
+        self.io_start = dict(DataPipe.io_stats)
+        self.rss_start = peak_rss_mb()
+        self.start_ts = time.time()
+        self.start_perf = time.perf_counter()
+        return self.record
+
+    def __exit__(self, exc_type, exc, tb):
+        exec_s = time.perf_counter() - self.start_perf
+        ready_ts = max([u['end_ts'] for u in self.upstream], default=None)
+        peak = peak_rss_mb()
+        self.record.update(
+            run_id=self.context.run_id,
+            job_name=self.context.job_name,
+            op=str(self.context.op_handle),
+            upstream=[u['op'] for u in self.upstream],
+            ready_ts=ready_ts,
+            start_ts=self.start_ts,
+            end_ts=self.start_ts + exec_s,
+            queue_wait_s=(None if ready_ts is None else max(0.0, self.start_ts - ready_ts)),
+            exec_s=exec_s,
+            peak_rss_mb=peak,
+            rss_growth_mb=(None if peak is None or self.rss_start is None else peak - self.rss_start),
+            bytes_read=DataPipe.io_stats['bytes_read'] - self.io_start['bytes_read'],
+            bytes_written=DataPipe.io_stats['bytes_written'] - self.io_start['bytes_written'],
+        )
+        self.record.setdefault('cached', False)
+        if exc_type is None:
+            write_record(self.record, self.log_dir)
+        return False # never swallow op failures
+
+
+def write_record(record: dict, log_dir=perf_log_dir):
+    """
+    append a single op record to the time-series log, partitioned by run
+    one file per op keeps concurrent op processes from contending for the same file
+    """
+    part_dir = os.path.join(log_dir, f"run_id={record['run_id']}")
+    os.makedirs(part_dir, exist_ok=True)
+    # run_id is carried by the partition directory name
+    file_schema = pa.schema([f for f in perf_schema if f.name != 'run_id'])
+    row = {k: record.get(k) for k in file_schema.names}
+    tbl = pa.Table.from_pylist([row], schema=file_schema)
+    pq.write_table(tbl, os.path.join(part_dir, f"{row['op']}.parquet"), compression='zstd')
+    return None
@@ -0,0 +1,114 @@
+"""
+Run-level performance report from the op_metrics time-series log
+
+compares runs of the ELT jobs (parallel, serial, tag-queued) on wall time, busy time, queue wait, memory and I/O,
+then walks the critical path of each run: from the last op to finish, step back to whichever upstream op finished last
+time on the critical path is attributed to either waiting in a queue or executing
+
+memory: peak_rss_mb is the process-wide peak, which the serial job's ops share, so per op compare max_op_rss_growth_mb
+
+usage: python perf_report.py [perf_log_dir]
+"""
+import pandas as pd
+import pyarrow.dataset as ds
+import sys
+
+from op_metrics import perf_log_dir, perf_schema
+
+
+elt_jobs = ('ELT_pipeline_job', 'ELT_pipeline_job_serial', 'ELT_pipeline_job_queued')
+
+
+def load_perf_log(log_dir=perf_log_dir, job_names=None) -> pd.DataFrame:
+    # the full schema rather than one inferred from the first file: columns added later read as null in older logs
+    data = ds.dataset(log_dir, format='parquet', partitioning='hive', schema=perf_schema).to_table().to_pandas()
+    if job_names:
+        data = data.loc[data.job_name.isin(job_names)]
+    return data.reset_index(drop=True)
+
+
+def critical_path(run: pd.DataFrame) -> pd.DataFrame:
+    """
+    ops on the critical path of a single run, in execution order
+    root ops are treated as ready when the run's first op started
+    """
+    run = run.set_index('op')
+    run_start = run.start_ts.min()
+    path = []
+    op = run.end_ts.idxmax()
+    while op is not None:
+        rec = run.loc[op]
+        ready = rec.ready_ts if pd.notna(rec.ready_ts) else run_start
+        path.append(dict(op=op,
+            wait_s=max(0.0, rec.start_ts - ready),
+            exec_s=rec.exec_s,
+            end_offset_s=rec.end_ts - run_start))
+        upstream = [u for u in rec.upstream if u in run.index]
+        op = run.loc[upstream].end_ts.idxmax() if upstream else None
+    return pd.DataFrame(path[::-1])
+
+
+def run_summary(data: pd.DataFrame) -> pd.DataFrame:
+    rows = []
+    for (run_id, job_name), run in data.groupby(['run_id', 'job_name']):
+        cp = critical_path(run)
+        wall_s = run.end_ts.max() - run.start_ts.min()
+        rows.append(dict(
+            job_name=job_name,
+            run_id=run_id,
+            started=pd.Timestamp(run.start_ts.min(), unit='s'),
+            n_ops=len(run),
+            n_cached=int(run.cached.fillna(False).sum()),
+            wall_s=wall_s,
+            busy_s=run.exec_s.sum(),
+            parallelism=run.exec_s.sum() / wall_s if wall_s > 0 else None,
+            queue_wait_s=run.queue_wait_s.sum(),
+            peak_rss_mb=run.peak_rss_mb.max(),
+            max_op_rss_growth_mb=run.rss_growth_mb.max(),
+            bytes_read=run.bytes_read.sum(),
+            bytes_written=run.bytes_written.sum(),
+            cp_ops=len(cp),
+            cp_exec_s=cp.exec_s.sum(),
+            cp_wait_s=cp.wait_s.sum(),
+            cp_path=' > '.join(cp.op),
+        ))
+    return pd.DataFrame(rows).sort_values(['job_name', 'started'])
+
+
+def compare_jobs(summary: pd.DataFrame) -> pd.DataFrame:
+    """
+    average each job's runs, with wall time relative to the fastest job
+    """
+    by_job = summary.groupby('job_name')[['wall_s', 'busy_s', 'parallelism', 'queue_wait_s',
+        'cp_exec_s', 'cp_wait_s', 'peak_rss_mb', 'max_op_rss_growth_mb', 'bytes_read', 'bytes_written']].mean()
+    by_job.insert(0, 'runs', summary.groupby('job_name').size())
+    by_job['rel_wall'] = by_job.wall_s / by_job.wall_s.min()
+    by_job['cp_wait_share'] = by_job.cp_wait_s / (by_job.cp_wait_s + by_job.cp_exec_s)
+    return by_job
+
+
+def op_attribution(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    how often each op lands on the critical path per job, and the time it contributes when it does
+    """
+    paths = []
+    for (run_id, job_name), run in data.groupby(['run_id', 'job_name']):
+        cp = critical_path(run)
+        cp['job_name'] = job_name
+        paths.append(cp)
+    paths = pd.concat(paths)
+    return (paths.groupby(['job_name', 'op'])
+        .agg(cp_runs=('op', 'size'), wait_s=('wait_s', 'mean'), exec_s=('exec_s', 'mean'))
+        .sort_values(['job_name', 'cp_runs'], ascending=[True, False]))
+
+
+if __name__ == '__main__':
+    log_dir = sys.argv[1] if len(sys.argv) > 1 else perf_log_dir
+    data = load_perf_log(log_dir, job_names=elt_jobs)
+    summary = run_summary(data)
+    pd.set_option('display.width', 200)
+    print(summary.drop(columns='cp_path').to_string(index=False))
+    print()
+    print(compare_jobs(summary).round(2).to_string())
+    print()
+    print(op_attribution(data).round(2).to_string())
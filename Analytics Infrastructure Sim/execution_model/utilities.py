@@ -75,34 +75,48 @@ class DataPipe:
     unlike a generic object, assert that there is metadata providing a sense of direction for the data in the pipe in addition to its current state
     applies opinionated defaults for convenience/consistency, otherwise pick your own options: https://pandas.pydata.org/docs/reference/index.html  
     """
-    def __init__(self): 
-        self.src_name: str = 'data-pipe'
-        self.src_format = None # one of storage_types 
-        self.obj = None # data object represented by rows and columns 
-        self.obj_format: str = 'uninit' # one of mem_types
-        return self
-
-    def __init__(self, metadata: dict):
-        self.src_name: str = metadata.get('src_name', 'data')
+    def __init__(self, metadata: dict=None):
+        metadata = metadata or dict()
+        self.src_name: str = metadata.get('src_name', 'data-pipe')
         self.src_format = metadata.get('src_format') # one of storage_types 
         self.obj = metadata.get('obj') # data object represented by rows and columns 
-        self.obj_format: str = metadata.get('obj_format') # one of mem_types
-        return self
+        self.obj_format: str = metadata.get('obj_format', 'uninit') # one of mem_types
         
-    store_types = set(
+    store_types = {
         'csv', # convenient, inefficient
         #'excel', # convenient, situational 
         'feather', # performant, scalable 
         'parquet', # performant, scalable 
         #'sql' # convenient 
-        )
-    mem_types = set(
+        }
+    mem_types = {
         'arrow', # performant, potentially large mem size 
         'df', # convenient, compatible 
         'df_lazy', # convenient, situational 
         #'pickle', # convenient, situational 
         #'uninit', 
-        )
+        }
+
+    # running totals of bytes moved between storage and memory by this process
+    # read by op_metrics to attribute I/O to each op 
+    io_stats = dict(bytes_read=0, bytes_written=0)
+
+    def _disk_size(full_path):
+        if os.path.isdir(full_path):
+            return sum(os.path.getsize(os.path.join(root, f)) 
+                for root, _, files in os.walk(full_path) for f in files)
+        elif os.path.exists(full_path):
+            return os.path.getsize(full_path)
+        return 0
+
+    def _count_io(full_path, key, size_before=0):
+        """
+        add the on-disk size of a file (or partitioned directory) to io_stats 
+        size_before excludes what was already there when appending 
+        """
+        size = DataPipe._disk_size(full_path) - size_before
+        DataPipe.io_stats[key] += size
+        return size
 
 
     ########## extract from storage to memory 
@@ -117,10 +131,11 @@ class DataPipe:
         md['src_name'] = file_name
         md['src_format'] = 'csv'
         md['obj'] = pd.read_csv(filepath_or_buffer=full_path, 
-            delimiter=',', encoding='utf8', header=0, usecols=col_spec
+            delimiter=',', encoding='utf8', header=0, usecols=col_spec, 
             na_filter=False, cache_dates=True, 
         )
         md['obj_format'] = 'df'
+        DataPipe._count_io(full_path, 'bytes_read')
         pipe = DataPipe(metadata=md)
         return pipe
 
@@ -148,6 +163,7 @@ class DataPipe:
             memory_map=True, iterator=iter_config, chunksize=chunk_config, 
         )
         md['obj_format'] = 'df_lazy'
+        DataPipe._count_io(full_path, 'bytes_read')
         pipe = DataPipe(metadata=md)
         return pipe 
 
@@ -161,6 +177,7 @@ class DataPipe:
             columns=col_spec, 
         )
         md['obj_format'] = 'arrow'
+        DataPipe._count_io(full_path, 'bytes_read')
         return DataPipe(metadata=md)
 
     # feather_to_df 
@@ -173,6 +190,7 @@ class DataPipe:
             columns=col_spec, 
         )
         md['obj_format'] = 'arrow'
+        DataPipe._count_io(full_path, 'bytes_read')
         return DataPipe(metadata=md)
 
     # parquet_to_arrow 
@@ -183,6 +201,7 @@ class DataPipe:
         md['src_format'] = 'parquet'
         md['obj'] = pq.read_table(source=full_path, columns=col_spec) 
         md['obj_format'] = 'arrow'
+        DataPipe._count_io(full_path, 'bytes_read')
         return DataPipe(metadata=md)
 
     # parquet_to_df 
@@ -196,6 +215,7 @@ class DataPipe:
             columns=col_spec, use_nullable_dtypes=True
         )
         md['obj_format'] = 'df'
+        DataPipe._count_io(full_path, 'bytes_read')
         return DataPipe(metadata=md)
 
     # excel_to_arrow 
@@ -232,15 +252,19 @@ class DataPipe:
     # df_to_csv 
     def df_to_csv(pipe, file_name, dest_path=None, append=False): 
         assert pipe.obj_format == 'df' 
-        pipe.obj: pd.DataFrame .to_csv(path_or_buf=(dest_path+file_name+'.csv'), mode=('a' if append else 'w'), 
+        full_path = (dest_path if dest_path else '') + file_name + '.csv'
+        size_before = DataPipe._disk_size(full_path) if append else 0
+        pipe.obj.to_csv(path_or_buf=full_path, mode=('a' if append else 'w'), 
             header=True, index=False, encoding='utf-8',
         )
+        DataPipe._count_io(full_path, 'bytes_written', size_before)
         return None 
 
     # arrow_to_feather
     def arrow_to_feather(pipe, file_name, dest_path=None):
         full_path = (dest_path if dest_path else '') + file_name
         pf.write_feather(df=pipe.obj, dest=full_path, compression='lz4')
+        DataPipe._count_io(full_path, 'bytes_written')
         return None 
 
     # df_to_feather
@@ -249,6 +273,7 @@ class DataPipe:
         pd.DataFrame.to_feather(self=pipe.obj, path=full_path, 
             compression='lz4'
             )
+        DataPipe._count_io(full_path, 'bytes_written')
         return None 
 
     # arrow_to_parquet 
@@ -257,10 +282,12 @@ class DataPipe:
     def df_to_parquet(pipe, file_name, dest_path, partition_val_cols=None): 
         assert pipe.obj_format == 'df' 
         full_path = (dest_path if dest_path else '') + file_name
-        pipe.obj:pd.DataFrame .to_parquet(path=full_path, index=False,
+        size_before = DataPipe._disk_size(full_path) if partition_val_cols else 0
+        pipe.obj.to_parquet(path=full_path, index=False,
             engine='pyarrow', compression='zstd',
             partition_cols=partition_val_cols
             )
+        DataPipe._count_io(full_path, 'bytes_written', size_before)
         return None 
 
     # arrow_to_sql 
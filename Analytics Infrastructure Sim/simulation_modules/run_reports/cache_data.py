@@ -26,6 +26,12 @@ for f in os.listdir("run_setup/ux_input/"):
     df.to_sql(name=table_name, schema="ux_input", con=pg_engine, if_exists='append', index=False)
 
 
+# summaries of the trade table from trade_pnl.py, small enough to cache directly 
+for f in ("pnl_by_trader", "pnl_by_asset"):
+    df = pd.read_parquet(path="run_reports/ux_output/"+f+".parquet") 
+    df.to_sql(name=f, schema="ux_output", con=pg_engine, if_exists='append', index=False)
+
+
 # data too large to handle, see Julia implementation
 # for f in os.listdir("run_simulation/ux_stage/"):
 #     table_name = f.split(sep=".")[0] 
@@ -45,3 +45,27 @@ create table ux_stage.trades (
     , asset_id text 
 ); 
 
+
+
+-- trade_pnl.py summaries 
+drop table if exists ux_output.pnl_by_trader; 
+create table ux_output.pnl_by_trader (
+    ux_id bigint 
+    , n_trades bigint 
+    , n_matched bigint 
+    , pnl double precision 
+    , n_wins bigint 
+    , mean_return double precision 
+    , win_rate double precision 
+);
+
+drop table if exists ux_output.pnl_by_asset; 
+create table ux_output.pnl_by_asset (
+    asset_id text 
+    , n_trades bigint 
+    , n_matched bigint 
+    , pnl double precision 
+    , n_wins bigint 
+    , mean_return double precision 
+    , win_rate double precision 
+);
@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import os, sys, time
+# join simulated trades to market outcomes and aggregate P&L, streaming the trade table in batches
+# each trade buys 1 unit of notional at prc_open and exits at prc_close on trade_date, so its P&L is asset_return
+#   (prc_close / prc_open - 1 where asset_return is missing)
+#
+# market_history is indexed once: (asset code, day) packed into one int64 key and sorted,
+#   each batch of trades packs the same key and finds its market row with searchsorted
+# per-asset totals accumulate in arrays indexed by asset code, per-trader totals are reduced per batch then combined
+# outputs are small summary tables for the reports, instead of pushing the raw trade table to Postgres
+#
+# usage: python trade_pnl.py [trades path/dir] [market_history.parquet] [output dir]
+
+
+trades_path = "run_simulation/ux_stage/trades_copy.parquet"
+market_path = "run_setup/ux_input/market_history.parquet"
+output_dir = "run_reports/ux_output/"
+
+
+class MarketIndex():
+    def __init__(self, market: pa.Table):
+        assets = pc.unique(market['asset_id']).cast(pa.string())
+        self.assets = assets.take(pc.sort_indices(assets))
+        day = pc.cast(market['prc_date'].cast(pa.date32()), pa.int32()).to_numpy()
+        self.day0 = int(day.min())
+        self.n_days = int(day.max()) - self.day0 + 1
+        code = pc.index_in(market['asset_id'].cast(pa.string()), value_set=self.assets).to_numpy()
+        key = code.astype(np.int64) * self.n_days + (day - self.day0)
+        order = np.argsort(key, kind='stable')
+        self.key = key[order]
+        # asset_return where recorded, otherwise the open -> close move
+        prc_open, prc_close, asset_return = (pc.cast(market[c], pa.float64()).to_numpy(zero_copy_only=False)
+            for c in ('prc_open', 'prc_close', 'asset_return'))
+        asset_return = np.where(np.isnan(asset_return), prc_close / prc_open - 1, asset_return)
+        self.asset_return = asset_return[order]
+
+    def asset_codes(self, asset_id: pa.Array) -> np.ndarray:
+        # -1 where the asset isn't in market_history; dictionary arrays only look up their dictionary
+        if pa.types.is_dictionary(asset_id.type):
+            lookup = pc.index_in(asset_id.dictionary.cast(pa.string()), value_set=self.assets)
+            lookup = lookup.fill_null(-1).to_numpy()
+            return lookup[asset_id.indices.to_numpy()]
+        return pc.index_in(asset_id.cast(pa.string()), value_set=self.assets).fill_null(-1).to_numpy()
+
+    def lookup(self, code: np.ndarray, day: np.ndarray):
+        """
+        position of each (asset code, day) in the sorted market arrays, and whether it was found
+        """
+        rel_day = day - self.day0
+        key = code.astype(np.int64) * self.n_days + rel_day
+        pos = np.minimum(np.searchsorted(self.key, key), len(self.key) - 1)
+        found = (code >= 0) & (rel_day >= 0) & (rel_day < self.n_days) & (self.key[pos] == key)
+        return pos, found
+
+
+def trade_pnl(trades_path=trades_path, market_path=market_path, output_dir=output_dir, batch_rows=2**22):
+    market = MarketIndex(ds.dataset(market_path).to_table(columns=['asset_id', 'prc_date', 'prc_open', 'prc_close', 'asset_return']))
+    n_assets = len(market.assets)
+    asset_trades = np.zeros(n_assets, dtype=np.int64)
+    asset_matched = np.zeros(n_assets, dtype=np.int64)
+    asset_pnl = np.zeros(n_assets)
+    asset_wins = np.zeros(n_assets, dtype=np.int64)
+    trader_parts = []
+    n_trades = 0
+    n_unmatched = 0
+
+    # hive partitioning recovers trade_date from the trade_date=YYYY-MM-DD/ directories of a partition_by_date write
+    trades = ds.dataset(trades_path, format='parquet', partitioning='hive')
+    for batch in trades.to_batches(columns=['ux_id', 'trade_date', 'asset_id'], batch_size=batch_rows):
+        code = market.asset_codes(batch.column('asset_id'))
+        day = pc.cast(batch.column('trade_date').cast(pa.date32()), pa.int32()).to_numpy()
+        pos, found = market.lookup(code, day)
+        ret = np.where(found, market.asset_return[pos], 0.0)
+        win = found & (ret > 0)
+
+        known = code >= 0
+        asset_trades += np.bincount(code[known], minlength=n_assets)
+        asset_matched += np.bincount(code[found], minlength=n_assets)
+        asset_pnl += np.bincount(code[found], weights=ret[found], minlength=n_assets)
+        asset_wins += np.bincount(code[win], minlength=n_assets)
+
+        ux_id = batch.column('ux_id').to_numpy()
+        trader_parts.append(pd.DataFrame(dict(ux_id=ux_id, n_trades=1, n_matched=found, pnl=ret, n_wins=win))
+            .groupby('ux_id', sort=False).sum())
+        if len(trader_parts) > 64: # keep the partial aggregates compact
+            trader_parts = [pd.concat(trader_parts).groupby(level=0).sum()]
+        n_trades += batch.num_rows
+        n_unmatched += int((~found).sum())
+
+    by_trader = pd.concat(trader_parts).groupby(level=0).sum().reset_index() if trader_parts else pd.DataFrame(
+        columns=['ux_id', 'n_trades', 'n_matched', 'pnl', 'n_wins'])
+    by_trader['mean_return'] = by_trader.pnl / by_trader.n_matched.where(by_trader.n_matched > 0)
+    by_trader['win_rate'] = by_trader.n_wins / by_trader.n_matched.where(by_trader.n_matched > 0)
+    by_asset = pd.DataFrame(dict(asset_id=market.assets.to_pylist(), n_trades=asset_trades, n_matched=asset_matched,
+        pnl=asset_pnl, n_wins=asset_wins))
+    by_asset['mean_return'] = by_asset.pnl / by_asset.n_matched.where(by_asset.n_matched > 0)
+    by_asset['win_rate'] = by_asset.n_wins / by_asset.n_matched.where(by_asset.n_matched > 0)
+
+    os.makedirs(output_dir, exist_ok=True)
+    by_trader.to_parquet(os.path.join(output_dir, 'pnl_by_trader.parquet'), index=False, compression='zstd')
+    by_asset.to_parquet(os.path.join(output_dir, 'pnl_by_asset.parquet'), index=False, compression='zstd')
+    return dict(n_trades=n_trades, n_unmatched=n_unmatched, n_traders=len(by_trader), n_assets=n_assets)
+
+
+if __name__ == '__main__':
+    paths = [trades_path, market_path, output_dir]
+    paths[:len(sys.argv) - 1] = sys.argv[1:4]
+    start = time.perf_counter()
+    print(trade_pnl(*paths), f"in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,101 @@
+import os, sys, time
+import json
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
+# clean the source corpora (names, addresses, occupations) for the census simulation
+# every rule is an arrow string kernel over the whole column, so a multi-million entry corpus is one pass
+# output is uncompressed Parquet, one string column, so census_generate and the fuzzy-join stages can memory-map it
+#
+# usage: python corpus_clean.py <kind> <source> [output.parquet]
+#   kind is one of the rule sets below, source is .json (keys of an object, or a list), .csv/.txt (one entry per line) or .parquet
+
+
+src_dir = "ux_src/"
+
+# per corpus: column name, then regex patterns every entry must match, patterns none may match, and length bounds
+rules = dict(
+    names = dict(
+        column = 'last_name',
+        keep = [r'^[A-Z][a-z]', r"^[A-Za-z][A-Za-z' -]*$"],
+        drop = [r'[ \'-]{2}', r'[ \'-]$'],
+        min_len = 2, max_len = 40,
+    ),
+    addresses = dict(
+        column = 'address',
+        keep = [r'^[0-9]+[A-Za-z]? [A-Za-z0-9]', r"^[A-Za-z0-9 .,'#/-]+$"],
+        drop = [r'  ', r'(?i)p\.?o\.? box'],
+        min_len = 6, max_len = 120,
+    ),
+    occupations = dict(
+        column = 'occupation',
+        keep = [r'^[A-Z]', r"^[A-Za-z][A-Za-z ,&()'/-]*$"],
+        drop = [r'  ', r'(?i)^(n/?a|none|unknown)$'],
+        min_len = 2, max_len = 80,
+    ),
+)
+
+
+def read_corpus(path) -> pa.Array:
+    """
+    entries of a corpus file as a single string array
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.json':
+        with open(path) as f:
+            data = json.load(f)
+        return pa.array(list(data), pa.string()) # dict -> keys, list -> items
+    if ext == '.parquet':
+        tbl = pq.read_table(path, memory_map=True)
+        return tbl.column(0).combine_chunks().cast(pa.string())
+    tbl = pv.read_csv(path, read_options=pv.ReadOptions(column_names=['entry']),
+        parse_options=pv.ParseOptions(delimiter='\t', quote_char=False),
+        convert_options=pv.ConvertOptions(column_types={'entry': pa.string()}))
+    return tbl.column('entry').combine_chunks()
+
+
+def clean(entries: pa.Array, keep=(), drop=(), min_len=1, max_len=None, unique=True) -> pa.Array:
+    """
+    trim whitespace, then keep entries matching all of keep, none of drop, and within the length bounds
+    unique keeps the first occurrence of each entry, in corpus order
+    """
+    entries = pc.utf8_trim_whitespace(entries.drop_null())
+    n_chars = pc.utf8_length(entries)
+    mask = pc.greater_equal(n_chars, min_len)
+    if max_len is not None:
+        mask = pc.and_(mask, pc.less_equal(n_chars, max_len))
+    for pattern in keep:
+        mask = pc.and_(mask, pc.match_substring_regex(entries, pattern))
+    for pattern in drop:
+        mask = pc.and_not(mask, pc.match_substring_regex(entries, pattern))
+    entries = entries.filter(mask)
+    if unique:
+        # first position of each distinct entry, kept in order
+        first = pa.table({'entry': entries, 'pos': pa.array(range(len(entries)), pa.int64())}) \
+            .group_by('entry', use_threads=False).aggregate([('pos', 'min')])
+        first = first['pos_min'].combine_chunks()
+        entries = entries.take(first.take(pc.sort_indices(first)))
+    return entries
+
+
+def write_corpus(entries: pa.Array, path, column='entry'):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    pq.write_table(pa.table({column: entries}), path, compression='none', use_dictionary=False,
+        row_group_size=2**20)
+
+
+def clean_corpus(kind, source, output=None) -> dict:
+    rule = rules[kind]
+    entries = read_corpus(source)
+    cleaned = clean(entries, rule['keep'], rule['drop'], rule['min_len'], rule['max_len'])
+    output = output or os.path.join(src_dir, f"{kind}_valid.parquet")
+    write_corpus(cleaned, output, rule['column'])
+    return dict(kind=kind, n_source=len(entries), n_valid=len(cleaned), output=output)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or sys.argv[1] not in rules:
+        sys.exit(f"usage: python corpus_clean.py <{'|'.join(rules)}> <source> [output.parquet]")
+    start = time.perf_counter()
+    print(clean_corpus(*sys.argv[1:4]), f"in {time.perf_counter() - start:.2f}s")
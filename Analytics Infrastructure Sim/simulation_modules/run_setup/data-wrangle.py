@@ -2,20 +2,19 @@ import os, typing as tp
 import csv, json, pandas, pyarrow
 import datetime 
 
+from corpus_clean import clean_corpus
+
 
 os.getcwd()
 os.listdir()
 
 
 # person names corpus 
-pnames = pandas.read_json('last_names.json', orient='index')
-ntxt = list(pnames.index)
-
-result: tp.List[str] = []
-for i in ntxt:
-    if (ord(i[0]) in range(65, 90)) and (ord(i[1]) in range(97, 122)):
-        result.append(i)
+# capitalised names (upper then lower case letter, including Z/z), cleaned as arrow string kernels in one pass
+result = clean_corpus('names', 'last_names.json', 'last_names_valid.parquet')
+result['n_valid']
 
-len(result)
-df = pandas.DataFrame({"first_name": result})
-df.to_csv('last_names_valid.csv')
+# addresses and occupations, when their source corpora are present
+for kind, source in (('addresses', 'addresses.txt'), ('occupations', 'occupations.txt')):
+    if os.path.exists(source):
+        print(clean_corpus(kind, source))
@@ -1,103 +1,221 @@
-import os, shutil, random, datetime 
-import pandas as pd 
+import os, argparse, time
+import concurrent.futures as cf
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 
 
-# create fake-data model for proof-of-concepts 
+# create fake-data model for proof-of-concepts
 """
-a - 'contract' transactions 
-b - 'advisor' mapping 
-c - 'client' mapping 
-d - 'date' mapping 
-e - 'product' mapping 
-f - exhaustive data mapping 
+a - 'contract' transactions
+b - 'advisor' mapping
+c - 'client' mapping
+d - 'date' mapping
+e - 'product' mapping
+f - exhaustive data mapping
+
+each table is sampled column-at-a-time with numpy, and ids are formatted with arrow string kernels,
+so row counts scale to 100M+ contracts for load testing the dbt models
+usage: python fake_data_simulation.py --out dbt_seed_folder/ --n-a 100000000 --seed 1337
+
+chunked mode generates a and f in fixed-size chunks across a process pool, appended to partitioned Parquet datasets,
+so memory stays flat at any row count; output depends on seed and chunk size, not on the number of workers
+usage: python fake_data_simulation.py --n-a 1000000000 --chunk-rows 5000000 --workers 8 --seed 1337
 """
 
 
-dbt_seed_folder = ''
-if not os.path.exists(dbt_seed_folder):
-    os.makedirs(dbt_seed_folder) 
+dbt_seed_folder = 'fake_data/'
 
 n_a = 1000
-n_b = 100 
-n_c = 300 
-n_d = 1096 
-n_e = 7 
-
-
-# b 
-b_list = []
-for b in range(n_b):
-    b_record = {}
-    b_record['b_id'] = f"b_{b}" 
-    b_record['adv_id'] = random.randint(100001, 990000) 
-    b_record['adv_name'] = f"Adv_{b}" 
-    b_list.append(b_record)
-
-b_data = pd.DataFrame(b_list)
-b_data.head()
-
-
-# c 
-c_list = []
-for c in range(n_c):
-    c_record = {}
-    c_record['c_id'] = f"c_{c}" 
-    c_record['clt_id'] = f"C{random.randint(50001, 59999)}" 
-    c_record['clt_name'] = f"Client_{c}" 
-    c_list.append(c_record)
-
-c_data = pd.DataFrame(c_list)
-c_data.head()
-
-
-# d 
-d_list = []
-for d in range(n_d):
-    d_record = {}
-    d_record['d_id'] = f"d_{d}" 
-    d_record['cal_date'] = datetime.date(2020, 1, 1) + datetime.timedelta(d)
-    d_record['week_day'] = datetime.date.weekday(d_record['cal_date']) 
-    d_record['bus_day'] = 1 if 0 <= d_record['week_day'] <= 4 else 0
-    d_list.append(d_record)
-
-d_data = pd.DataFrame(d_list)
-d_data.head(32) 
-
-
-# e 
-e_list = []
-for e in range(n_e):
-    e_record = {}
-    e_record['e_id'] = f"e_{e}" 
-    e_record['prod_id'] = f"p{(e+1) * 100}" 
-    e_record['prod_name'] = f"Prod_{chr(65+e)}"
-    e_list.append(e_record)
-
-e_data = pd.DataFrame(e_list)
-e_data.head()
-
-
-# a 
-a_list = []
-for a in range(n_a):
-    a_record = {}
-    a_record['a_id'] = f"a_{a}" 
-    a_record['cont_id'] = f"{chr(65 + random.randint(0, 5))}{random.randint(1111111,8888888)}" 
-    a_record['cont_adv_id'] = b_data.adv_id[random.randint(0, n_b-1)]
-    a_record['cont_own_id'] = c_data.clt_id[random.randint(0, n_c-1)]
-    a_record['cont_prod_id'] = e_data.prod_id[random.randint(0, n_e-1)]
-    a_record['cont_date'] = d_data.cal_date[random.randint(0, n_d-1)]
-    a_record['cont_amt'] = 1000 * random.randint(100, 1000)
-    a_list.append(a_record)
-
-a_data = pd.DataFrame(a_list)
-a_data.head()
-
-
-# f 
-f_data = pd.merge(a_data, b_data, 'left', left_on='cont_adv_id', right_on='adv_id')
-f_data = pd.merge(f_data, c_data, 'left', left_on='cont_own_id', right_on='clt_id')
-f_data = pd.merge(f_data, e_data, 'left', left_on='cont_prod_id', right_on='prod_id')
-f_data = pd.merge(f_data, d_data, 'left', left_on='cont_date', right_on='cal_date')
-f_data.head()
-
+n_b = 100
+n_c = 300
+n_d = 1096
+n_e = 7
+
+
+def labels(prefix: str, ids: np.ndarray) -> pa.Array:
+    # vectorized f"{prefix}{id}"
+    return pc.binary_join_element_wise(prefix, pc.cast(pa.array(ids), pa.string()), '')
+
+
+def sample_unique(rng: np.random.Generator, low: int, high: int, size: int) -> np.ndarray:
+    # distinct integers in [low, high], widening the range if it can't hold size values
+    high = max(high, low + 2*size)
+    return low + rng.choice(high - low + 1, size=size, replace=False)
+
+
+# b
+def gen_b(n_b, rng) -> pa.Table:
+    idx = np.arange(n_b)
+    return pa.table({
+        'b_id': labels('b_', idx),
+        'adv_id': sample_unique(rng, 100001, 990000, n_b),
+        'adv_name': labels('Adv_', idx),
+    })
+
+
+# c
+def gen_c(n_c, rng) -> pa.Table:
+    idx = np.arange(n_c)
+    return pa.table({
+        'c_id': labels('c_', idx),
+        'clt_id': labels('C', sample_unique(rng, 50001, 59999, n_c)),
+        'clt_name': labels('Client_', idx),
+    })
+
+
+# d
+def gen_d(n_d) -> pa.Table:
+    idx = np.arange(n_d)
+    cal_date = np.datetime64('2020-01-01') + idx
+    week_day = (cal_date.astype('datetime64[D]').view('int64') - 4) % 7 # 1970-01-01 was a Thursday, Monday = 0
+    return pa.table({
+        'd_id': labels('d_', idx),
+        'cal_date': pa.array(cal_date, pa.date32()),
+        'week_day': week_day,
+        'bus_day': (week_day <= 4).astype(np.int64),
+    })
+
+
+# e
+def gen_e(n_e) -> pa.Table:
+    idx = np.arange(n_e)
+    return pa.table({
+        'e_id': labels('e_', idx),
+        'prod_id': labels('p', (idx + 1) * 100),
+        'prod_name': pa.array([f"Prod_{chr(65+e)}" for e in idx]),
+    })
+
+
+# a
+def gen_a(n_a, b_data, c_data, d_data, e_data, rng, offset=0, with_pos=False) -> pa.Table:
+    """
+    contracts reference the dimension tables by sampled row position, gathered with take()
+    offset numbers a_id when a is generated in pieces
+    with_pos also returns the sampled positions, which join_f uses in place of a key lookup
+    """
+    cont_letter = pa.array([chr(65 + i) for i in range(6)]).take(rng.integers(0, 6, n_a))
+    cont_num = labels('', rng.integers(1111111, 8888888, n_a, endpoint=True))
+    pos = dict(
+        b=rng.integers(0, b_data.num_rows, n_a),
+        c=rng.integers(0, c_data.num_rows, n_a),
+        e=rng.integers(0, e_data.num_rows, n_a),
+        d=rng.integers(0, d_data.num_rows, n_a),
+    )
+    a_data = pa.table({
+        'a_id': labels('a_', np.arange(offset, offset + n_a)),
+        'cont_id': pc.binary_join_element_wise(cont_letter, cont_num, ''),
+        'cont_adv_id': b_data['adv_id'].take(pos['b']),
+        'cont_own_id': c_data['clt_id'].take(pos['c']),
+        'cont_prod_id': e_data['prod_id'].take(pos['e']),
+        'cont_date': d_data['cal_date'].take(pos['d']),
+        'cont_amt': 1000 * rng.integers(100, 1000, n_a, endpoint=True),
+    })
+    return (a_data, pos) if with_pos else a_data
+
+
+# f
+def join_f(a_data: pa.Table, pos: dict, b_data, c_data, d_data, e_data) -> pa.Table:
+    """
+    a left-joined to b, c, e and d on their keys, built by gathering dimension rows at the positions a was sampled from
+    (the keys are unique, so this equals the left joins without hashing or reordering the contracts)
+    """
+    f_data = a_data
+    for dim, key in ((b_data, 'b'), (c_data, 'c'), (e_data, 'e'), (d_data, 'd')):
+        rows = dim.take(pos[key])
+        for name in dim.column_names:
+            f_data = f_data.append_column(name, rows[name])
+    return f_data
+
+
+def write_table(tbl: pa.Table, name, out_dir=dbt_seed_folder):
+    pq.write_table(tbl, os.path.join(out_dir, f"{name}_data.parquet"),
+        compression='zstd', row_group_size=2**20)
+
+
+def generate(out_dir=dbt_seed_folder, n_a=n_a, n_b=n_b, n_c=n_c, n_d=n_d, n_e=n_e, seed=None, write_f=True):
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    b_data = gen_b(n_b, rng)
+    c_data = gen_c(n_c, rng)
+    d_data = gen_d(n_d)
+    e_data = gen_e(n_e)
+    a_data, pos = gen_a(n_a, b_data, c_data, d_data, e_data, rng, with_pos=True)
+    tables = dict(a=a_data, b=b_data, c=c_data, d=d_data, e=e_data)
+    if write_f:
+        tables['f'] = join_f(a_data, pos, b_data, c_data, d_data, e_data)
+    del pos
+    for name, tbl in tables.items():
+        write_table(tbl, name, out_dir)
+    return tables
+
+
+##### chunked mode
+
+_dims = dict() # dimension tables, loaded once per worker process
+
+def _init_chunk_worker(dims):
+    _dims.update(dims)
+
+def _gen_chunk(chunk, offset, n_rows, seed_seq, out_dir, write_f):
+    rng = np.random.default_rng(seed_seq)
+    dims = (_dims['b'], _dims['c'], _dims['d'], _dims['e'])
+    a_data, pos = gen_a(n_rows, *dims, rng, offset=offset, with_pos=True)
+    pq.write_table(a_data, os.path.join(out_dir, 'a_data', f"part-{chunk:05d}.parquet"),
+        compression='zstd', row_group_size=2**20)
+    if write_f:
+        pq.write_to_dataset(join_f(a_data, pos, *dims), os.path.join(out_dir, 'f_data'),
+            partition_cols=['prod_id'], basename_template=f"part-{chunk:05d}-{{i}}.parquet",
+            compression='zstd')
+    return n_rows
+
+
+def generate_chunked(out_dir=dbt_seed_folder, n_a=n_a, n_b=n_b, n_c=n_c, n_d=n_d, n_e=n_e, seed=None,
+        write_f=True, chunk_rows=5_000_000, workers=None):
+    """
+    dimension tables are generated up front and shipped to each worker once
+    contracts are generated in chunks of chunk_rows, each with its own seed spawned from seed,
+    written to a_data/part-NNNNN.parquet and (joined) to f_data/prod_id=.../part-NNNNN-*.parquet
+    """
+    os.makedirs(os.path.join(out_dir, 'a_data'), exist_ok=True)
+    seed_seq = np.random.SeedSequence(seed)
+    rng = np.random.default_rng(seed_seq)
+    dims = dict(b=gen_b(n_b, rng), c=gen_c(n_c, rng), d=gen_d(n_d), e=gen_e(n_e))
+    for name, tbl in dims.items():
+        write_table(tbl, name, out_dir)
+
+    offsets = range(0, n_a, chunk_rows)
+    chunk_seeds = seed_seq.spawn(len(offsets))
+    n_rows = 0
+    with cf.ProcessPoolExecutor(max_workers=workers, initializer=_init_chunk_worker, initargs=(dims,)) as pool:
+        jobs = [pool.submit(_gen_chunk, i, offset, min(chunk_rows, n_a - offset), chunk_seeds[i], out_dir, write_f)
+            for i, offset in enumerate(offsets)]
+        for job in cf.as_completed(jobs):
+            n_rows += job.result()
+    return dict(a=n_rows, **{k: v.num_rows for k, v in dims.items()})
+
+
+if __name__ == '__main__':
+    args = argparse.ArgumentParser(description='generate the fake-data model as Parquet')
+    args.add_argument('--out', default=dbt_seed_folder)
+    args.add_argument('--n-a', type=int, default=n_a, help='contracts')
+    args.add_argument('--n-b', type=int, default=n_b, help='advisors')
+    args.add_argument('--n-c', type=int, default=n_c, help='clients')
+    args.add_argument('--n-d', type=int, default=n_d, help='days from 2020-01-01')
+    args.add_argument('--n-e', type=int, default=n_e, help='products')
+    args.add_argument('--seed', type=int, default=None)
+    args.add_argument('--no-f', action='store_true', help='skip the exhaustive f table')
+    args.add_argument('--chunk-rows', type=int, default=None, help='generate contracts in chunks of this many rows')
+    args.add_argument('--workers', type=int, default=None, help='processes for chunked mode (default: all cores)')
+    opts = args.parse_args()
+
+    start = time.perf_counter()
+    if opts.chunk_rows:
+        counts = generate_chunked(opts.out, opts.n_a, opts.n_b, opts.n_c, opts.n_d, opts.n_e, opts.seed,
+            write_f=not opts.no_f, chunk_rows=opts.chunk_rows, workers=opts.workers)
+        print(counts, f"in {time.perf_counter() - start:.2f}s")
+    else:
+        tables = generate(opts.out, opts.n_a, opts.n_b, opts.n_c, opts.n_d, opts.n_e, opts.seed, write_f=not opts.no_f)
+        print({k: len(v) for k, v in tables.items()}, f"in {time.perf_counter() - start:.2f}s")
+        print(tables['a'].slice(0, 5).to_pandas())
@@ -1,14 +1,13 @@
-
 import pandas as pd
-import os, random, time
+import numpy as np
+import os, time
+from trade_engine import simulate_trades, simulate_trades_streaming, simulate_trades_sharded, write_trades
 # define trading-decision logic (move to module later)
 # naive: independent uniform random choice of asset daily 
 # personality: weighted independent choices daily seeded on 'investor profile'
 # behaviour: markov process selection, weighted by the previous choice and/or outcome 
 
 sim_path = "S:/Datasets & Projects/LocalRepo/Sample-Projects/Analytics Infrastructure Sim/simulation_modules/"
-os.chdir(sim_path)
-os.getcwd()
 
 # class Transaction: 
 #     def __init__(self, tx_id, ux_id, trade_date, asset_id): 
@@ -16,43 +15,49 @@ os.getcwd()
 #         self.ux_id = ux_id 
 #         self.trade_date = trade_date 
 #         self.asset_id = asset_id 
+# record-per-trade versions of trade_naive:
+#   Transaction objects took 28min, couldn't convert to DataFrame 
+#   dict records crashed from memory error after 5min 
+# replaced by the columnar engine in trade_engine.py: whole columns from a cartesian index product, 
+#   vectorized asset sampling, dictionary-encoded asset_id, written straight to Parquet 
 
+# 'naive', 'personality' or 'markov', see trade_engine.py 
+strategy = 'naive' 
+# fix for reproducible trades, None for fresh entropy 
+seed = None 
+# > 0: shard traders across this many processes, one part file per shard (output identical for any worker count) 
+shard_workers = 0 
+# otherwise stream blocks of traders to disk when the full trade table won't fit in memory 
+stream_output = True 
 
-def trade_naive(traders, trade_dates, options): 
-    # naive: independent uniform random choice of asset daily 
-    tx = []
-    tx_id = 5_000_000_000
-    for t in traders: 
-        for td in trade_dates: 
-            tx_id += 1
-            # record = Transaction( 
-            #     tx_id, 
-            #     t, 
-            #     td, 
-            #     random.sample(options, 1)[0]
-            # ) # took 28min, couldn't convert to DataFrame 
-            record = dict(
-                tx_id=tx_id, 
-                ux_id=t, 
-                trade_date=td, 
-                asset_id=random.sample(options, 1)[0]
-            ) # crashed from memory error after 5min 
-            tx.append(record)
-    return tx
 
-print("starting ", time.localtime())
-df = pd.read_parquet("run_setup/ux_input/census.parquet")
-traders = df.loc[[r == "o53" for r in df.occup_cd]]
-df = pd.read_parquet("run_setup/ux_input/date_labels.parquet")
-trade_dates = df.loc[df.bus_date]
-df = pd.read_parquet("run_setup/ux_input/market_history.parquet")
-options = list(df.asset_id.unique())
+if __name__ == '__main__': # guard for process-pool workers re-importing this script
+    os.chdir(sim_path)
+    print("starting ", time.localtime())
+    df = pd.read_parquet("run_setup/ux_input/census.parquet")
+    traders = df.loc[df.occup_cd == "o53"]
+    df = pd.read_parquet("run_setup/ux_input/date_labels.parquet")
+    trade_dates = df.loc[df.bus_date]
+    df = pd.read_parquet("run_setup/ux_input/market_history.parquet")
+    options = list(df.asset_id.unique())
 
-print("ready ", time.localtime())
-activity_tbl = pd.DataFrame(trade_naive(traders.ux_id, trade_dates.julia_date, options))
-print("saving ", time.localtime())
-activity_tbl.to_parquet("run_simulation/ux_stage/trades_copy.parquet", compression='zstd')
-print("done ", time.localtime())
+    print("ready ", time.localtime())
+    if shard_workers: 
+        manifest = simulate_trades_sharded("run_simulation/ux_stage/trades_copy/", 
+            traders.ux_id.to_numpy(), trade_dates.julia_date.to_numpy(), options, 
+            seed=seed, workers=shard_workers, strategy=strategy)
+        print(f"saved {manifest['rows']} trades in {len(manifest['parts'])} parts ", time.localtime())
+    elif stream_output: 
+        n_trades = simulate_trades_streaming("run_simulation/ux_stage/trades_copy.parquet", 
+            traders.ux_id.to_numpy(), trade_dates.julia_date.to_numpy(), options, 
+            rng=np.random.default_rng(seed), strategy=strategy)
+        print(f"saved {n_trades} trades ", time.localtime())
+    else: 
+        activity_tbl = simulate_trades(traders.ux_id.to_numpy(), trade_dates.julia_date.to_numpy(), options, 
+            rng=np.random.default_rng(seed), strategy=strategy)
+        print("saving ", time.localtime())
+        write_trades(activity_tbl, "run_simulation/ux_stage/trades_copy.parquet")
+    print("done ", time.localtime())
 
 """
 Benchmarked 2023-04
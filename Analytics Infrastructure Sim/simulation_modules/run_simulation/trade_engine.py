@@ -0,0 +1,268 @@
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import concurrent.futures as cf
+import json, os
+# columnar trade simulation (python counterpart of run_trades.jl)
+# one trade per (trader, trade date), built as whole columns instead of a record per trade:
+#   tx_id       sequential from tx_id_base, trader-major
+#   ux_id       trader ids repeated across dates   (cartesian index product)
+#   trade_date  dates tiled across traders
+#   asset_id    dictionary-encoded: int32 index into the asset options
+# trading strategies are batched kernels: given trader positions and a number of dates, return a (traders, dates) matrix of asset indices
+#   naive: independent uniform random choice of asset daily
+#   personality: weighted independent choices daily, from a cumulative weight matrix per investor profile (or per trader)
+#   markov: each day's choice drawn from the transition row of the trader's previous choice, all traders advanced together
+# streaming mode generates a block of traders or trade dates at a time and hands each block to a writer thread,
+#   so at most two blocks are in memory and Parquet encoding overlaps generation of the next block
+# sharded mode splits traders into fixed-size shards across a process pool, one Parquet part file per shard,
+#   each shard drawing from its own SeedSequence child, so the output for a seed doesn't depend on the worker count
+
+
+tx_id_base = 5_000_000_000
+
+trades_schema = pa.schema([
+    ('tx_id', pa.int64()),
+    ('ux_id', pa.int64()),
+    ('trade_date', pa.date32()),
+    ('asset_id', pa.dictionary(pa.int32(), pa.string())),
+])
+
+
+def cumulative_weights(weights: np.ndarray) -> np.ndarray:
+    # row-normalised cumulative weights, last column exactly 1
+    cum = np.cumsum(weights / weights.sum(axis=1, keepdims=True), axis=1)
+    cum[:, -1] = 1.0
+    return cum
+
+
+def offset_rows(cum: np.ndarray) -> np.ndarray:
+    # offset each row by its index so the flattened matrix stays sorted: row r spans (r, r+1]
+    return (cum + np.arange(cum.shape[0])[:, None]).reshape(-1)
+
+
+def draw_rows(flat: np.ndarray, n_options, rows: np.ndarray, u: np.ndarray) -> np.ndarray:
+    """
+    inverse-cdf draw from row rows[i] of a cumulative weight matrix (flattened by offset_rows) for every u[i, ...],
+    all in one searchsorted call
+    """
+    rows = rows.reshape(rows.shape + (1,) * (u.ndim - rows.ndim))
+    idx = np.searchsorted(flat, rows + u, side='right') - rows * n_options
+    return np.minimum(idx, n_options - 1).astype(np.int32) # guard rounding of rows + u up to the next row
+
+
+class NaiveKernel():
+    # naive: independent uniform random choice of asset daily
+    def __init__(self, n_options):
+        self.n_options = n_options
+
+    def __call__(self, trader_pos, n_dates, rng: np.random.Generator) -> np.ndarray:
+        return rng.integers(0, self.n_options, size=(len(trader_pos), n_dates), dtype=np.int32)
+
+
+class PersonalityKernel():
+    """
+    personality: weighted independent choices daily seeded on 'investor profile'
+    each profile is a Dirichlet draw over the options (low concentration -> a few favourite assets)
+    n_profiles=None gives every trader their own profile
+    """
+    def __init__(self, n_options, n_traders, rng: np.random.Generator, n_profiles=None, concentration=0.3):
+        self.n_options = n_options
+        n_rows = n_profiles or n_traders
+        # only the flattened form is kept: n_rows x n_options floats per shard worker
+        cum_weights = cumulative_weights(rng.dirichlet(np.full(n_options, concentration), size=n_rows))
+        self.flat = offset_rows(cum_weights)
+        self.profile = (rng.integers(0, n_profiles, n_traders) if n_profiles else np.arange(n_traders))
+
+    def __call__(self, trader_pos, n_dates, rng: np.random.Generator) -> np.ndarray:
+        u = rng.random((len(trader_pos), n_dates))
+        return draw_rows(self.flat, self.n_options, self.profile[trader_pos], u)
+
+
+class MarkovKernel():
+    """
+    behaviour: markov process selection, weighted by the previous choice
+    transitions favour repeating the previous asset (stickiness), otherwise a Dirichlet draw per asset
+    the previous choice is kept per trader, so consecutive date blocks continue the chain
+    """
+    def __init__(self, n_options, n_traders, rng: np.random.Generator, stickiness=0.8, concentration=0.3):
+        self.n_options = n_options
+        switch = rng.dirichlet(np.full(n_options, concentration), size=n_options)
+        cum_transitions = cumulative_weights(stickiness * np.eye(n_options) + (1 - stickiness) * switch)
+        self.flat = offset_rows(cum_transitions)
+        self.prev = np.full(n_traders, -1, dtype=np.int32) # -1: no choice yet, first day is uniform
+
+    def __call__(self, trader_pos, n_dates, rng: np.random.Generator) -> np.ndarray:
+        out = np.empty((n_dates, len(trader_pos)), dtype=np.int32) # date-major while stepping, contiguous rows
+        prev = self.prev[trader_pos]
+        u = rng.random((n_dates, len(trader_pos)))
+        for d in range(n_dates):
+            start = prev < 0
+            prev = draw_rows(self.flat, self.n_options, np.maximum(prev, 0), u[d])
+            prev[start] = (u[d][start] * self.n_options).astype(np.int32)
+            out[d] = prev
+        self.prev[trader_pos] = prev
+        return np.ascontiguousarray(out.T)
+
+
+def make_kernel(strategy, n_options, n_traders, rng: np.random.Generator, **params):
+    if strategy == 'naive':
+        return NaiveKernel(n_options)
+    elif strategy == 'personality':
+        return PersonalityKernel(n_options, n_traders, rng, **params)
+    elif strategy == 'markov':
+        return MarkovKernel(n_options, n_traders, rng, **params)
+    raise ValueError(f"unknown trading strategy '{strategy}'")
+
+
+def trade_table(ux_id, trade_dates, asset_idx: np.ndarray, options: pa.Array,
+        trader_start=0, date_start=0, n_dates_total=None) -> pa.Table:
+    """
+    assemble the trades for every (trader, date) pair from a (n_traders, n_dates) matrix of asset indices
+    for a block of the full product, trader_start/date_start locate the block and n_dates_total is the full date count,
+    so tx_id is the same however the product is split up
+    """
+    ux_id = np.asarray(ux_id, dtype=np.int64)
+    trade_dates = np.asarray(trade_dates, dtype='datetime64[D]')
+    n_traders, n_dates = len(ux_id), len(trade_dates)
+    n_dates_total = n_dates_total or n_dates
+    tx_id = ((trader_start + np.arange(n_traders, dtype=np.int64))[:, None] * n_dates_total
+        + (date_start + np.arange(n_dates, dtype=np.int64))[None, :])
+    return pa.table([
+        pa.array(tx_id_base + 1 + tx_id.reshape(-1)),
+        pa.array(np.repeat(ux_id, n_dates)),
+        pa.array(np.tile(trade_dates, n_traders), pa.date32()),
+        pa.DictionaryArray.from_arrays(asset_idx.reshape(-1), options),
+    ], schema=trades_schema)
+
+
+def simulate_trades(ux_id, trade_dates, options, rng: np.random.Generator=None, strategy='naive', **params) -> pa.Table:
+    rng = rng or np.random.default_rng()
+    options = pa.array(options, pa.string())
+    kernel = make_kernel(strategy, len(options), len(ux_id), rng, **params)
+    asset_idx = kernel(np.arange(len(ux_id)), len(trade_dates), rng)
+    return trade_table(ux_id, trade_dates, asset_idx, options)
+
+
+def write_trades(tbl: pa.Table, path):
+    pq.write_table(tbl, path, compression='zstd', row_group_size=2**20)
+
+
+def trade_blocks(ux_id, trade_dates, options, rng: np.random.Generator, block_traders=None, block_dates=None, kernel=None):
+    """
+    yield the trade table one block at a time: block_dates trade dates for all traders, or block_traders traders for all dates
+    """
+    ux_id = np.asarray(ux_id, dtype=np.int64)
+    trade_dates = np.asarray(trade_dates, dtype='datetime64[D]')
+    options = pa.array(options, pa.string())
+    n_traders, n_dates = len(ux_id), len(trade_dates)
+    kernel = kernel or NaiveKernel(len(options))
+    if block_dates:
+        for d in range(0, n_dates, block_dates):
+            dates = trade_dates[d : d + block_dates]
+            asset_idx = kernel(np.arange(n_traders), len(dates), rng)
+            yield trade_table(ux_id, dates, asset_idx, options, date_start=d, n_dates_total=n_dates)
+    else:
+        block_traders = block_traders or max(1, 2**23 // max(1, n_dates))
+        for t in range(0, n_traders, block_traders):
+            traders = ux_id[t : t + block_traders]
+            asset_idx = kernel(np.arange(t, t + len(traders)), n_dates, rng)
+            yield trade_table(traders, trade_dates, asset_idx, options, trader_start=t)
+
+
+def write_trades_streaming(blocks, path, partition_by_date=False):
+    """
+    write blocks as they are generated, zstd throughout
+        single file: one or more row groups per block through an incremental ParquetWriter
+        partition_by_date: a trade_date=YYYY-MM-DD/ directory per date, one part file per block
+    the next block is generated while the writer thread encodes the previous one
+    """
+    n_rows = 0
+    writer = None if partition_by_date else pq.ParquetWriter(path, trades_schema, compression='zstd')
+
+    def write_block(k, tbl):
+        if writer:
+            writer.write_table(tbl, row_group_size=2**20)
+        else:
+            pq.write_to_dataset(tbl, path, partition_cols=['trade_date'],
+                basename_template=f"part-{k:05d}-{{i}}.parquet", compression='zstd')
+        return tbl.num_rows
+
+    try:
+        with cf.ThreadPoolExecutor(max_workers=1) as pool:
+            pending = None
+            for k, tbl in enumerate(blocks):
+                if pending:
+                    n_rows += pending.result() # bound memory: wait for the previous block before queueing this one
+                pending = pool.submit(write_block, k, tbl)
+                del tbl
+            if pending:
+                n_rows += pending.result()
+    finally:
+        if writer:
+            writer.close()
+    return n_rows
+
+
+def simulate_trades_streaming(path, ux_id, trade_dates, options, rng: np.random.Generator=None,
+        block_traders=None, block_dates=None, partition_by_date=False, strategy='naive', **params) -> int:
+    rng = rng or np.random.default_rng()
+    kernel = make_kernel(strategy, len(options), len(ux_id), rng, **params)
+    blocks = trade_blocks(ux_id, trade_dates, options, rng, block_traders=block_traders, block_dates=block_dates, kernel=kernel)
+    return write_trades_streaming(blocks, path, partition_by_date=partition_by_date)
+
+
+##### sharded mode
+
+_shard_kernel = dict() # strategy kernel, built once per worker process
+
+def _init_shard_worker(strategy, n_options, n_traders, kernel_seed, params):
+    # every worker builds the same kernel from the same seed, so trader profiles/transitions agree across shards
+    _shard_kernel['kernel'] = make_kernel(strategy, n_options, n_traders, np.random.default_rng(kernel_seed), **params)
+
+
+def _run_shard(shard, trader_start, ux_id, trade_dates, options, seed_seq, out_dir):
+    rng = np.random.default_rng(seed_seq)
+    options = pa.array(options, pa.string())
+    asset_idx = _shard_kernel['kernel'](np.arange(trader_start, trader_start + len(ux_id)), len(trade_dates), rng)
+    tbl = trade_table(ux_id, trade_dates, asset_idx, options, trader_start=trader_start)
+    part = f"part-{shard:05d}.parquet"
+    write_trades(tbl, os.path.join(out_dir, part))
+    tx_id = tbl['tx_id']
+    return dict(part=part, shard=shard, rows=tbl.num_rows,
+        tx_id_min=int(tx_id[0].as_py()), tx_id_max=int(tx_id[-1].as_py()),
+        ux_id_min=int(ux_id[0]), ux_id_max=int(ux_id[-1]))
+
+
+def simulate_trades_sharded(out_dir, ux_id, trade_dates, options, seed=None, workers=None,
+        shard_traders=None, strategy='naive', **params) -> dict:
+    """
+    partition traders into shards of shard_traders, simulate each shard in a process pool and write out_dir/part-NNNNN.parquet
+    SeedSequence(seed) spawns one child for the strategy kernel and one per shard
+    returns the manifest, also written to out_dir/_manifest.json
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    for f in os.listdir(out_dir): # parts from a previous run with more shards would leak into the dataset
+        if f.startswith('part-') and f.endswith('.parquet'):
+            os.remove(os.path.join(out_dir, f))
+    ux_id = np.asarray(ux_id, dtype=np.int64)
+    trade_dates = np.asarray(trade_dates, dtype='datetime64[D]')
+    options = [str(o) for o in options]
+    n_traders, n_dates = len(ux_id), len(trade_dates)
+    shard_traders = shard_traders or max(1, 2**23 // max(1, n_dates))
+    starts = range(0, n_traders, shard_traders)
+
+    seed_seq = np.random.SeedSequence(seed)
+    kernel_seed, *shard_seeds = seed_seq.spawn(len(starts) + 1)
+    with cf.ProcessPoolExecutor(max_workers=workers, initializer=_init_shard_worker,
+            initargs=(strategy, len(options), n_traders, kernel_seed, params)) as pool:
+        jobs = [pool.submit(_run_shard, k, t, ux_id[t : t + shard_traders], trade_dates, options, shard_seeds[k], out_dir)
+            for k, t in enumerate(starts)]
+        parts = sorted((job.result() for job in cf.as_completed(jobs)), key=lambda p: p['shard'])
+
+    manifest = dict(seed=seed_seq.entropy, strategy=strategy, params=params,
+        n_traders=n_traders, n_dates=n_dates, shard_traders=shard_traders,
+        rows=sum(p['rows'] for p in parts), parts=parts)
+    with open(os.path.join(out_dir, '_manifest.json'), 'w', encoding='utf8') as f:
+        json.dump(manifest, f, indent=2, default=str)
+    return manifest
@@ -6,311 +6,376 @@
 import os
 import sys
 import time
+import glob
+import json
 import numpy as np
 import matplotlib.pyplot as plt
+import queue
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import creature_engine as engine
+from creature_brain import Brain
+import creature_replay as replay
+import creature_timing as timing
+import creature_operators as operators
 
 # start of creature-evolution setup
-simulation = dict(iterations=5, watch_gen=1, max_gen=100)
-world_param = dict(rows=22, cols=42, rock=80, food=90, creature=50)
-world = np.empty((world_param['rows'], world_param['cols']), str)
-symbol = dict(rock='#', food='.', creature='C', weak='w', empty=' ')
+# populations evolve independently; all iterations of all populations are simulated as one stack of worlds
+simulation = dict(iterations=5, populations=1, watch_gen=1, max_gen=100, seed=None)
+# network arithmetic; np.float32 halves the weight and activation memory traffic
+precision = np.float64
+# watched generations: headless records world (0, 0) to replay_dir for creature_replay.py, otherwise render to the console
+display = dict(headless=True, replay_dir='replays/', fps=30)
+# world sizes: sight and moves cost the same per creature at any size, so large worlds scale with the creature count
+world_presets = dict(small=dict(rows=22, cols=42, rock=80, food=90, creature=50),
+                     large=dict(rows=1000, cols=1000, rock=40000, food=50000, creature=2000))
+world_param = world_presets['small']
+
+# island model: each island evolves its populations in its own process with its own generator
+# every migrate_every generations an island's top migrants replace the weakest of the next island around the ring
+islands = dict(islands=1, migrate_every=10, migrants=2)
+
+# every n generations each island saves its weights, fitness history and generator state to checkpoint_dir
+# resume continues from the latest generation every island has saved (max_gen can be raised to extend a run)
+# keep: checkpoints per island beyond that one are pruned, but never the latest common generation or anything newer
+checkpoint = dict(every=10, checkpoint_dir='checkpoints/', keep=2, resume=False)
+
+# per-phase wall time per generation, one CSV per island (see creature_timing); profiler='pyinstrument' samples the main process
+profiling = dict(timing_log='timing/island_{island:02d}.csv', profiler=None, profile_html='timing/profile.html')
 
 # columns=['alive','energy','action','y','x','age','fitness']
-# matrix of integers to track creature state
-creatures = np.zeros((world_param['creature'], 7), int)
+# creature state is a matrix of integers per world, the world is an int8 grid of object codes (see creature_engine)
 
 eyesight = 6
-objects = (symbol['empty'], symbol['rock'], symbol['food'], symbol['creature'], symbol['weak'])
 nnet = dict(n_input=35,  # 8 dir * 4 obj + ener, mem1 + bias
             n_hidden1=8, # 7 + bias
             n_hidden2=6, # 5 + bias
             n_output=6)  # idle, up, down, left, right, memory
-bias = dict(input=1, 
-            hidden1=1, 
+bias = dict(input=1,
+            hidden1=1,
             hidden2=1)
 
-mutation = dict(survivors=int(world_param['creature'] / 5),
+# selection: 'truncation' (top survivors cloned), 'tournament', or 'elitist' (top elite kept, the rest by tournament)
+# mutation: each weight of a new clone moves by up to max_amt_sm with chance_sm, or is redrawn with chance_lg
+mutation = dict(selection='truncation', survivors=int(world_param['creature'] / 5), tournament_size=3, elite=2,
                 chance_sm=0.10, max_amt_sm=0.50, chance_lg=0.01)
-if world_param['creature'] % mutation['survivors'] != 0: 
-    print('survivors not a factor of # of creatures')
-    sys.exit()
-
-def init_world():
-    # generate empty world with borders
-    world[:, :] = symbol['empty']
-    world[(0, -1), :] = symbol['rock']
-    world[:, (0, -1)] = symbol['rock']
-    
-    # populate the world with rocks, food, creatures
-    locations = np.random.choice(a=(world_param['rows'] - 2) * (world_param['cols'] - 2),
-                                    size=sum([world_param.get(k) for k in ['creature','food','rock']]), replace=False)
-    for l in range(len(locations)):
-        r = (locations[l]-1) // (world_param['cols']-2) + 1
-        c = (locations[l]-1) % (world_param['cols']-2) + 1
-        if l < world_param['creature']:
-            world[r, c] = symbol['creature']
-            creatures[l, 3] = r
-            creatures[l, 4] = c
-        elif l < world_param['creature'] + world_param['food']:
-            world[r, c] = symbol['food']
-        else:
-            world[r, c] = symbol['rock']
-
-    # initialise creatures
-    creatures[:,1] = np.random.choice(range(65, 86), size=world_param['creature'], replace=True)
-    creatures[:,0] = True
-    # end init_world()
-
-
-def look(critter):
-    row, col = (critter[3], critter[4])
-    # given a critter's position, check the straight sightlines
-    # return inputs for 4 directions, 4 object types
-    sight = np.zeros(16)
-    up = world[row-1 : row-eyesight, col]
-    down = world[row+1 : row+eyesight, col]
-    left = world[row, col-1 : col-eyesight]
-    right = world[row, col+1 : col+eyesight]
-
-    for i, dir in enumerate([up, down, left, right]):
-        for j, sqr in enumerate(dir):
-            if sqr == objects[0]:
-                continue # look past empty spaces
-            elif sqr == objects[1]:
-                sight[i*4 + 0] = 1 - 2*(j/eyesight)
-                break
-            elif sqr == objects[2]:
-                sight[i*4 + 1] = 1 - 2*(j/eyesight)
-                break
-            elif sqr == objects[3]:
-                sight[i*4 + 2] = 1 - 2*(j/eyesight)
-                break
-            elif sqr == objects[4]:
-                sight[i*4 + 3] = 1 - 2*(j/eyesight)
-                break
-            else:
-                print('wtf is that?')
-
-    return sight
-
-
-def move(critter):
-    # given current location and intended action
-    # update the state of the creature and the world
-
-    if not critter[0]:
-        # dead critters don't move
-        return critter
-        #sys.exit()
-
-    cost = 1
-    if critter[2] == 0:  
-        pass
-    else:
-        y_dest = int(critter[3])
-        x_dest = int(critter[4])
-        
-        if critter[2] == 1:  # up
-            y_dest -= 1
-        elif critter[2] == 2:  # down
-            y_dest += 1
-        elif critter[2] == 3:  # left
-            x_dest -= 1
-        elif critter[2] == 4:  # right
-            x_dest += 1
-
-        if world[y_dest, x_dest] in (symbol['empty'], symbol['food']):
-            world[critter[3], critter[4]] = symbol['empty']
-            if world[y_dest, x_dest] == symbol['food']:
-                cost = -25
-                critter[6] += 1 # explicitly reward eating food
-            critter[3] = y_dest
-            critter[4] = x_dest
-        else:  # rock, creature, or weak creature
-            cost = 2
-            critter[6] -= 1 # explicitly punish walking into things
-            # no change in position or world
-    
-    critter[1] -= cost
-
-    if critter[1] > 50:
-        world[critter[3], critter[4]] = symbol['creature']
-    elif critter[1] > 0:
-        world[critter[3], critter[4]] = symbol['weak']
-    else: # died
-        critter[0] = False
-        critter[5] = sim_age
-        world[critter[3], critter[4]] = symbol['food']
-    return critter
-    # end move()
-
-
-# initialise the simulation
-sim_start = time.perf_counter()
-sim_CPU_start = time.process_time()
-
-#np.random.seed(1337)
-
-sim_age_highest = 0
-hist_fitness = np.zeros(simulation['max_gen'], dtype=int)
-
-# allocate structure of the neural network layers
-nn_input = np.zeros((world_param['creature'], nnet['n_input']), float)
-nn_hidden1 = np.zeros((world_param['creature'], nnet['n_hidden1']), float)
-nn_hidden2 = np.zeros((world_param['creature'], nnet['n_hidden2']), float)
-nn_output = np.zeros((world_param['creature'], nnet['n_output']), float)
-
-# initialise bias terms
-nn_input[:,-1] = bias['input']
-nn_hidden1[:,-1] = bias['hidden1']
-nn_hidden2[:,-1] = bias['hidden2']
-
-# initialise first generation with random weights, floats from -1 to 1
-w_input_hidden1 = 2 * np.random.ranf(size=(world_param['creature'], 
-                                                nnet['n_input'], 
-                                                nnet['n_hidden1']-1)) - 1
-w_hidden1_hidden2 = 2 * np.random.ranf(size=(world_param['creature'], 
-                                                nnet['n_hidden1'], 
-                                                nnet['n_hidden2']-1)) - 1
-w_hidden2_output = 2 * np.random.ranf(size=(world_param['creature'], 
-                                                nnet['n_hidden2'], 
-                                                nnet['n_output'])) - 1
-
-
-# start main simulation process
-for generation in range(simulation['max_gen']):
-    # record peak fitness of previous generation
-    # before resetting fitness on every generation start
-    gen_start = time.perf_counter()
-    creatures[:,6] = 0
-
-    # creatures live n-lives per generation
-    for iteration in range(simulation['iterations']):
-        
-        # generate new world populated with creatures, food, rocks
-        #  and initialise creatures
-        init_world()
-        living_creatures = world_param['creature']
-        sim_age = 1
-
-        while living_creatures > 0:
-            # simulate a step, update all creatures
-            
-            # calculate NN inputs to decide action
-            nn_input[:,:-3] = 0
-            # memory
-            #nn_input[:, 34] = nn_input[:, 33] # mem 2 takes the value of mem 1
-            nn_input[:, 33] = nn_output[:, -1] # mem 1 is output from last time
-            # energy
-            nn_input[:, 32] = (creatures[:,1] / 50) - 1
-            
-            # eyesight; inputs 0-31
-            # straight lines of sight
-            nn_input[:, 0:16] = np.apply_along_axis(func1d=look, axis=1, arr=creatures)
-            # diagonal lines of sight
-            # (not implemented)
-
-            # neural net inference
-            #print('got to NN')
-            #####
-            nn_hidden1[:,:-1] = 0
-            nn_hidden2[:,:-1] = 0
-            nn_output[:,:] = 0
-
-            if not np.isfinite(w_input_hidden1).all():
-                print(w_input_hidden1)
-                sys.exit()
-            elif not np.isfinite(w_hidden1_hidden2).all():
-                print(w_hidden1_hidden2)
-                sys.exit()
-            elif not np.isfinite(w_hidden2_output).all():
-                print(w_hidden2_output)
-                sys.exit()
-
-
-            nn_hidden1[:,:-1] = np.einsum('ci,cih->ch', nn_input, w_input_hidden1)
-            if not np.isfinite(nn_hidden1).all():
-                print(np.round_(nn_hidden1, 2))
-                sys.exit()
-            nn_hidden1[nn_hidden1 < 0] = 0 # RELU activation
-            nn_hidden2[:,:-1] = np.einsum('ch,chj->cj', nn_hidden1, w_hidden1_hidden2)
-            if not np.isfinite(nn_hidden2).all():
-                print(np.round_(nn_hidden2, 2))
-                sys.exit()
-            nn_hidden2[nn_hidden2 < 0] = 0 # RELU activation
-            nn_output[:,:] = np.einsum('cj,cjo->co', nn_hidden2, w_hidden2_output)
-            # decide action from NN output
-            creatures[:,2] = np.argmax(nn_output, axis=1)
-
-            #creatures.action = 0 # OVERWHELMINGLY LAZY CREATURES for testing
-            
-            # determine resulting creature and world state
-            #creatures = creatures.apply(func=move, axis=1) # pandas apply tries first function call twice -> side effects occur twice
-            #for index, critter in creatures.iterrows(): creatures.loc[index] = move(critter) # pandas iterrows ... not fast enough
-            creatures = np.apply_along_axis(func1d=move, axis=1, arr=creatures) # pure numpy, very fast
-            #print('moved creatures, ',living_creatures)
-            living_creatures = sum(creatures[:,0])
-            sim_age += 1
-            sim_age_highest = max(sim_age_highest, sim_age)
-
-            # render world after a warm-up period
-            if (simulation['max_gen']-1 - generation) < simulation['watch_gen']:
-                os.system('cls')
-                print('Gen:' + str(generation) + ' Iter:' + str(iteration) +
-                      ' Age:' + str(sim_age) + ' Alive:' + str(living_creatures))
-                np.savetxt(fname=sys.stdout, X=world, fmt='%c', delimiter=' ')
-                #print(creatures)
-                time.sleep(0.03)
-            # end step update
-        creatures[:,6] += creatures[:,5]
-        # end iteration
-    
+
+# per-creature weight tensors, (population, creature, layer in, layer out)
+weight_shapes = dict(w_input_hidden1=(nnet['n_input'], nnet['n_hidden1']-1),
+                     w_hidden1_hidden2=(nnet['n_hidden1'], nnet['n_hidden2']-1),
+                     w_hidden2_output=(nnet['n_hidden2'], nnet['n_output']))
+
+n_pop, n_iter, n_crit = simulation['populations'], simulation['iterations'], world_param['creature']
+
+
+def init_weights(rng):
+    # first generation with random weights, floats from -1 to 1
+    return {name: 2 * rng.random(size=(n_pop, n_crit) + shape) - 1 for name, shape in weight_shapes.items()}
+
+
+def run_generation(brain, rng, generation, timer, watch=False):
+    """
+    creatures live n-lives per generation, all at once, deciding with brain (loaded with this generation's weights)
+    returns fitness (population, creature) summed over iterations, and the age the last creature reached
+    """
+    nn_input, nn_output = brain.input, brain.output
+
+    # generate new worlds populated with creatures, food, rocks
+    #  and initialise creatures
+    world, creatures = engine.init_world(**world_param, rng=rng, worlds=(n_pop, n_iter))
+    living_creatures = n_pop * n_iter * n_crit
+    sim_age = 1
+    recorder = replay.ReplayRecorder(world[0, 0], creatures[0, 0], generation) if watch and display['headless'] else None
+    timer.lap('init')
+
+    while living_creatures > 0:
+        # simulate a step, update all creatures in all worlds
+
+        # calculate NN inputs to decide action
+        nn_input[..., :-3] = 0
+        # memory
+        #nn_input[..., 34] = nn_input[..., 33] # mem 2 takes the value of mem 1
+        # mem 1 is output from last time; cleared once dead, since a world keeps stepping until every world is done
+        nn_input[..., 33] = nn_output[..., -1] * creatures[..., 0].transpose(0, 2, 1)
+        # energy
+        nn_input[..., 32] = (creatures[..., 1].transpose(0, 2, 1) / 50) - 1
+
+        # eyesight; inputs 0-31
+        # straight lines of sight 0-15, diagonal lines of sight 16-31
+        nn_input[..., 0:32] = engine.look(world, creatures, eyesight).transpose(0, 2, 1, 3)
+        timer.lap('look')
+
+        # neural net inference, into the brain's preallocated layers
+        #####
+        brain.forward()
+        # decide action from NN output
+        creatures[..., 2] = np.argmax(nn_output, axis=-1).transpose(0, 2, 1)
+        timer.lap('nn')
+
+        #creatures[..., 2] = 0 # OVERWHELMINGLY LAZY CREATURES for testing
+
+        # determine resulting creature and world state
+        engine.move(world, creatures, sim_age) # all creatures at once, conflicts go to the lowest index
+        living_creatures = creatures[..., 0].sum()
+        sim_age += 1
+        timer.steps += 1
+        timer.lap('move')
+
+        # record or render world after a warm-up period
+        if recorder is not None:
+            recorder.step(world[0, 0], creatures[0, 0])
+        elif watch:
+            sys.stdout.write('\x1b[H\x1b[2J' + 'Gen:' + str(generation) + ' Age:' + str(sim_age) +
+                             ' Alive:' + str(creatures[0, :, :, 0].sum(axis=-1)) + '\n' + engine.render(world[0, 0]) + '\n')
+            sys.stdout.flush()
+            time.sleep(1 / display['fps'])
+        timer.lap('record')
+        # end step update
+
+    if recorder is not None:
+        recorder.save(os.path.join(display['replay_dir'], f"gen_{generation:05d}.npz"))
+        timer.lap('record')
     # iterations completed for the generation
-    #print('got to GA')
-    # Genetic modification algorithm
-    #####
-    # select indices of creatures by fitness (top 20%)
-    hist_fitness[generation] = max(creatures[:,6]) / simulation['iterations']
-    winners = np.argsort(a=creatures[:,6], axis=0, kind='quicksort')[-mutation['survivors']:]
-    # next generation start as clones of the survivors
-    w_input_hidden1 = np.tile(A=w_input_hidden1[winners,:,:], reps=(5,1,1))
-    w_hidden1_hidden2 = np.tile(A=w_hidden1_hidden2[winners,:,:], reps=(5,1,1))
-    w_hidden2_output = np.tile(A=w_hidden2_output[winners,:,:], reps=(5,1,1))
-    # keep one set (surviviors) intact, generate mutations for the rest
-    mut_ih1 = mutation['max_amt_sm'] * (-1 + 2 * np.random.ranf(
-        size=(world_param['creature'] - mutation['survivors'],
-                nnet['n_input'], nnet['n_hidden1']-1)))
-    mut_h1h2 = mutation['max_amt_sm'] * (-1 + 2 * np.random.ranf(
-        size=(world_param['creature'] - mutation['survivors'], 
-                nnet['n_hidden1'], nnet['n_hidden2']-1)))
-    mut_h2o = mutation['max_amt_sm'] * (-1 + 2 * np.random.ranf(
-        size=(world_param['creature'] - mutation['survivors'], 
-                nnet['n_hidden2'], nnet['n_output'])))
-    # generate mutation activations (probabilistic)
-    act_ih1 = mutation['chance_sm'] > np.random.ranf(
-        size=(world_param['creature'] - mutation['survivors'],
-                nnet['n_input'], nnet['n_hidden1']-1))#.astype(float)
-    act_h1h2 = mutation['chance_sm'] > np.random.ranf(
-        size=(world_param['creature'] - mutation['survivors'], 
-                nnet['n_hidden1'], nnet['n_hidden2']-1))#.astype(float)
-    act_h2o = mutation['chance_sm'] > np.random.ranf(
-        size=(world_param['creature'] - mutation['survivors'], 
-                nnet['n_hidden2'], nnet['n_output']))#.astype(float)
-    # apply mutations to new clones where activated
-    w_input_hidden1[mutation['survivors']:, :, :] += mut_ih1 * act_ih1
-    w_hidden1_hidden2[mutation['survivors']:, :, :] += mut_h1h2 * act_h1h2
-    w_hidden2_output[mutation['survivors']:, :, :] += mut_h2o * act_h2o
-    #####
-    
-    if generation % 10 == 0:
-        print('Generation', generation, 'completed in', format(time.perf_counter() - gen_start,'.2f'))
-
-# all generations completed
-print('Simulation completed in', format(time.perf_counter() - sim_start, '.2f'), 
-'\nCPU time:', format(time.process_time() - sim_CPU_start, '.2f'))
-
-# plot progression
-print(hist_fitness)
-
-plt.plot(hist_fitness)
-plt.show()
+    return (creatures[..., 6] + creatures[..., 5]).sum(axis=1), sim_age
+
+
+def reproduce(weights, fitness, rng, timer=None):
+    """
+    Genetic modification algorithm
+    select a parent for every creature of the next generation, then mutate the clones (see creature_operators)
+    with a timer, the select, clone and mutate steps are each charged to their own phase
+    """
+    parents, keep = operators.select(mutation['selection'], fitness, rng, mutation['survivors'],
+                                     mutation['tournament_size'], mutation['elite'])
+    if timer is not None:
+        timer.lap('select')
+    # next generation start as clones of the parents, the first keep of each population intact
+    offspring = {name: np.take_along_axis(w, parents[:, :, None, None], axis=1) for name, w in weights.items()}
+    if timer is not None:
+        timer.lap('clone')
+    for name, child in offspring.items():
+        operators.mutate(child, keep, rng, mutation['chance_sm'], mutation['max_amt_sm'], mutation['chance_lg'])
+    if timer is not None:
+        timer.lap('mutate')
+    return offspring
+
+
+def migrate(weights, fitness, island, exchange):
+    """
+    publish this island's top migrants, then take the previous island's in place of its weakest
+    migrants keep the fitness they earned at home, so they compete in the next selection
+    """
+    board, barrier = exchange
+    m = islands['migrants']
+    order = np.argsort(fitness, axis=1, kind='stable')
+    best, worst = order[:, -m:], order[:, :m]
+    board['fitness'][island] = np.take_along_axis(fitness, best, axis=1)
+    for name in weight_shapes:
+        board[name][island] = np.take_along_axis(weights[name], best[:, :, None, None], axis=1)
+    barrier.wait() # every island has published
+
+    src = (island - 1) % islands['islands']
+    np.put_along_axis(fitness, worst, board['fitness'][src], axis=1)
+    for name in weight_shapes:
+        np.put_along_axis(weights[name], worst[:, :, None, None], board[name][src], axis=1)
+    barrier.wait() # every island has read, so the board can be overwritten
+
+
+##### checkpoints
+
+def checkpoint_path(generation, island):
+    return os.path.join(checkpoint['checkpoint_dir'], f"gen_{generation:05d}_island_{island:02d}.npz")
+
+
+def saved_checkpoints(island):
+    return sorted(glob.glob(os.path.join(checkpoint['checkpoint_dir'], f"gen_*_island_{island:02d}.npz")))
+
+
+def saved_generations(island):
+    return set(int(os.path.basename(f)[4:9]) for f in saved_checkpoints(island))
+
+
+def common_generation(n_islands):
+    # most recent generation saved by every island, 0 when there is none
+    common = set.intersection(*[saved_generations(i) for i in range(n_islands)])
+    return max(common) if common else 0
+
+
+def save_checkpoint(generation, island, weights, hist_fitness, sim_age_highest, rng):
+    """
+    state after `generation` completed generations; written to a temporary file and renamed, so a kill leaves no partial file
+    """
+    path = checkpoint_path(generation, island)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+        np.savez(f, generation=generation, hist_fitness=hist_fitness[:generation], sim_age_highest=sim_age_highest,
+                 rng_state=json.dumps(rng.bit_generator.state), **weights)
+    os.replace(path + '.tmp', path)
+    # keep the most recent few per island, and whatever an island lagging behind still needs to resume alongside it
+    common = common_generation(islands['islands'])
+    for old in saved_checkpoints(island)[:-checkpoint['keep']]:
+        if int(os.path.basename(old)[4:9]) < common:
+            os.remove(old)
+
+
+def load_checkpoint(generation, island, rng):
+    """
+    weights, fitness history and highest age saved after `generation` generations; restores rng to its saved state
+    """
+    with np.load(checkpoint_path(generation, island)) as ckpt:
+        weights = {name: ckpt[name] for name in weight_shapes}
+        for name, shape in weight_shapes.items():
+            if weights[name].shape != (n_pop, n_crit) + shape:
+                raise ValueError(f"checkpoint {name} has shape {weights[name].shape}, expected {(n_pop, n_crit) + shape}")
+        hist_fitness = np.zeros((max(simulation['max_gen'], generation), n_pop), dtype=int)
+        hist_fitness[:generation] = ckpt['hist_fitness']
+        sim_age_highest = int(ckpt['sim_age_highest'])
+        rng.bit_generator.state = json.loads(str(ckpt['rng_state']))
+    return weights, hist_fitness, sim_age_highest
+
+
+def latest_checkpoint(n_islands):
+    """
+    generation to resume from: the most recent one saved by every island
+    raises rather than silently starting over when the islands share none
+    """
+    common = common_generation(n_islands)
+    if not common:
+        saved = {i: sorted(saved_generations(i)) for i in range(n_islands)}
+        raise FileNotFoundError(f"no checkpoint generation common to all {n_islands} islands in "
+                                f"{checkpoint['checkpoint_dir']}: {saved}")
+    return common
+
+
+def evolve(rng, island=0, exchange=None, start=0):
+    """
+    run every generation of one island, from a checkpoint after `start` generations when start > 0
+    returns its fitness history (generation, population), highest age reached, and the final weights
+    """
+    if start > 0:
+        weights, hist_fitness, sim_age_highest = load_checkpoint(start, island, rng)
+    else:
+        sim_age_highest = 0
+        hist_fitness = np.zeros((simulation['max_gen'], n_pop), dtype=int)
+        weights = init_weights(rng)
+    # batch shapes: worlds are (population, iteration), the network runs creature-major over (population, creature, iteration)
+    # so each layer is one batched matmul of every creature's inputs across its worlds against that creature's weights
+    brain = Brain((n_pop, n_crit, n_iter), **nnet, bias=bias, dtype=precision)
+    timer = timing.PhaseTimer()
+    log = timing.PhaseLog(profiling['timing_log'].format(island=island)) if profiling['timing_log'] else None
+
+    # start main simulation process
+    for generation in range(start, simulation['max_gen']):
+        timer.start()
+        watch = island == 0 and (simulation['max_gen']-1 - generation) < simulation['watch_gen']
+        brain.load(weights) # checked once per generation, not per step
+        fitness, sim_age = run_generation(brain, rng, generation, timer, watch)
+        sim_age_highest = max(sim_age_highest, sim_age)
+        hist_fitness[generation] = fitness.max(axis=1) / n_iter
+        timer.lap('record')
+
+        if exchange is not None and (generation + 1) % islands['migrate_every'] == 0:
+            migrate(weights, fitness, island, exchange)
+            timer.lap('migrate') # includes waiting for the other islands
+        weights = reproduce(weights, fitness, rng, timer)
+        if (generation + 1) % checkpoint['every'] == 0:
+            save_checkpoint(generation + 1, island, weights, hist_fitness, sim_age_highest, rng)
+            timer.lap('checkpoint')
+
+        row = timer.row(island=island, generation=generation, worlds=n_pop * n_iter, creatures=n_crit,
+                        cells=world_param['rows'] * world_param['cols'], best_fitness=int(hist_fitness[generation].max()))
+        if log is not None:
+            log.write(row)
+        if generation % 10 == 0:
+            print(f"Island {island} " if exchange else '', 'Generation ', generation, ' completed in ',
+                  format(row['total_s'], '.2f'), sep='')
+    return hist_fitness, sim_age_highest, weights
+
+
+##### island model
+
+def _board_shapes():
+    # one migrant slot per island: (island, population, migrant, ...)
+    shapes = {name: (islands['islands'], n_pop, islands['migrants']) + shape for name, shape in weight_shapes.items()}
+    shapes['fitness'] = (islands['islands'], n_pop, islands['migrants'])
+    return shapes
+
+
+def _island_worker(island, seed_seq, shm_names, barrier, results, start):
+    blocks = {name: shared_memory.SharedMemory(name=shm_names[name]) for name in shm_names}
+    board = {name: np.ndarray(shape, dtype=np.float64 if name != 'fitness' else np.int64, buffer=blocks[name].buf)
+             for name, shape in _board_shapes().items()}
+    hist_fitness, sim_age_highest, weights = evolve(np.random.default_rng(seed_seq), island, (board, barrier), start)
+    results.put((island, hist_fitness, sim_age_highest))
+    del board # release the views before closing the blocks
+    for shm in blocks.values():
+        shm.close()
+
+
+def evolve_islands(start=0):
+    """
+    start one process per island, seeded from simulation['seed'] or resumed after `start` generations,
+    with migrant boards in shared memory
+    returns the fitness history of every island's populations side by side, and the highest age reached
+    """
+    n_islands = islands['islands']
+    seeds = np.random.SeedSequence(simulation['seed']).spawn(n_islands)
+    blocks = dict()
+    for name, shape in _board_shapes().items():
+        blocks[name] = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * 8)
+    barrier = mp.Barrier(n_islands)
+    results = mp.Queue()
+    try:
+        workers = [mp.Process(target=_island_worker, args=(i, seeds[i], {k: v.name for k, v in blocks.items()},
+                                                          barrier, results, start))
+                   for i in range(n_islands)]
+        for w in workers:
+            w.start()
+        hist = dict()
+        while len(hist) < n_islands:
+            try:
+                island, hist_fitness, sim_age_highest = results.get(timeout=1)
+                hist[island] = (hist_fitness, sim_age_highest)
+            except queue.Empty:
+                # an island that died would leave the others waiting at the next migration
+                if any(w.exitcode not in (None, 0) for w in workers):
+                    barrier.abort()
+                    for w in workers:
+                        w.terminate()
+                    raise RuntimeError('island process failed')
+        for w in workers:
+            w.join()
+    finally:
+        for shm in blocks.values():
+            shm.close()
+            shm.unlink()
+    return (np.concatenate([hist[i][0] for i in range(n_islands)], axis=1),
+            max(hist[i][1] for i in range(n_islands)))
+
+
+if __name__ == '__main__':
+    # initialise the simulation
+    sim_start = time.perf_counter()
+    sim_CPU_start = time.process_time()
+
+    profiler = timing.start_profiler(profiling['profiler'])
+    start = latest_checkpoint(islands['islands']) if checkpoint['resume'] else 0
+    if start:
+        print('Resuming from generation', start)
+
+    if islands['islands'] > 1:
+        hist_fitness, sim_age_highest = evolve_islands(start)
+    else:
+        hist_fitness, sim_age_highest, weights = evolve(np.random.default_rng(simulation['seed']), start=start)
+
+    # all generations completed
+    timing.stop_profiler(profiler, profiling['profile_html'])
+    print('Simulation completed in', format(time.perf_counter() - sim_start, '.2f'),
+    '\nCPU time:', format(time.process_time() - sim_CPU_start, '.2f'))
+
+    # plot progression
+    print(hist_fitness)
+
+    plt.plot(hist_fitness)
+    plt.show()
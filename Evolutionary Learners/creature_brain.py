@@ -0,0 +1,52 @@
+# creature_brain.py
+# forward pass of the creature networks for creature-evolution.py
+# every layer writes into a buffer allocated once per run, bias columns are set once and never overwritten,
+# and the weights are checked and packed (optionally as float32) once per generation instead of on every step
+
+import numpy as np
+
+
+class Brain():
+    def __init__(self, batch, n_input, n_hidden1, n_hidden2, n_output, bias, dtype=np.float64):
+        """
+        batch is the leading shape shared by the weights (population, creature) plus any extra axes (iteration)
+        the last input and hidden units are bias terms, as in nnet
+        """
+        self.dtype = np.dtype(dtype)
+        self.input = np.zeros(batch + (n_input,), self.dtype)
+        self.hidden1 = np.zeros(batch + (n_hidden1,), self.dtype)
+        self.hidden2 = np.zeros(batch + (n_hidden2,), self.dtype)
+        self.output = np.zeros(batch + (n_output,), self.dtype)
+        self.input[..., -1] = bias['input']
+        self.hidden1[..., -1] = bias['hidden1']
+        self.hidden2[..., -1] = bias['hidden2']
+        # the layer outputs are written through views that skip the bias column
+        self._hidden1 = self.hidden1[..., :-1]
+        self._hidden2 = self.hidden2[..., :-1]
+        self.weights = None
+
+    def load(self, weights):
+        """
+        validate and pack a generation's weights, (population, creature, layer in, layer out) each
+        """
+        for name, w in weights.items():
+            if not np.isfinite(w).all():
+                raise ValueError(f"non-finite weights in {name}")
+        self.weights = [np.ascontiguousarray(w, self.dtype) for w in weights.values()]
+        self.reset()
+
+    def reset(self):
+        # clear the recurrent memory between generations
+        self.output[...] = 0
+
+    def forward(self):
+        """
+        three matmuls with ReLU between them, from self.input into self.output
+        """
+        w_input_hidden1, w_hidden1_hidden2, w_hidden2_output = self.weights
+        np.matmul(self.input, w_input_hidden1, out=self._hidden1)
+        np.maximum(self._hidden1, 0, out=self._hidden1) # RELU activation
+        np.matmul(self.hidden1, w_hidden1_hidden2, out=self._hidden2)
+        np.maximum(self._hidden2, 0, out=self._hidden2) # RELU activation
+        np.matmul(self.hidden2, w_hidden2_output, out=self.output)
+        return self.output
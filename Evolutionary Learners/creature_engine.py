@@ -0,0 +1,137 @@
+# creature_engine.py
+# vectorized world for creature-evolution.py
+# the world is an int8 grid of object codes, every creature's sight and move is computed at once with gathered index arrays
+# so the cost of a step follows the grid operations rather than a Python call per creature
+# worlds can be stacked on leading axes, world (..., rows, cols) with creatures (..., creature, 7), and step together
+
+import numpy as np
+
+# object codes, also the order of the sight inputs per direction (after empty)
+code = dict(empty=0, rock=1, food=2, creature=3, weak=4)
+glyphs = np.array([' ', '#', '.', 'C', 'w'])
+
+# columns of the creature state matrix
+state = dict(alive=0, energy=1, action=2, y=3, x=4, age=5, fitness=6)
+
+# actions: idle, up, down, left, right, memory (memory stays put, so it bumps into itself like the original)
+action_dy = np.array([0, -1, 1, 0, 0, 0])
+action_dx = np.array([0, 0, 0, -1, 1, 0])
+
+# sightlines: up, down, left, right, then the diagonals up-left, up-right, down-left, down-right
+sight_dy = np.array([-1, 1, 0, 0, -1, -1, 1, 1])
+sight_dx = np.array([0, 0, -1, 1, -1, 1, -1, 1])
+
+
+def init_world(rows, cols, rock, food, creature, rng=np.random, worlds=None):
+    """
+    new world with rock borders and randomly placed rocks, food and creatures
+    returns the int8 world grid and the creature state matrix
+    worlds, a shape like (populations, iterations), stacks that many independent worlds on leading axes
+    """
+    batch = () if worlds is None else tuple(np.atleast_1d(worlds))
+    world = np.full(batch + (rows, cols), code['empty'], np.int8)
+    world[..., (0, -1), :] = code['rock']
+    world[..., :, (0, -1)] = code['rock']
+    creatures = np.zeros(batch + (creature, 7), int)
+
+    # distinct interior cells per world: creatures first, then food, then rocks
+    kinds = np.repeat(np.array([code['creature'], code['food'], code['rock']], np.int8), [creature, food, rock])
+    for w in np.ndindex(batch):
+        locations = rng.choice((rows - 2) * (cols - 2), size=creature + food + rock, replace=False)
+        r = locations // (cols - 2) + 1
+        c = locations % (cols - 2) + 1
+        world[w][r, c] = kinds
+        creatures[w][:, state['y']] = r[:creature]
+        creatures[w][:, state['x']] = c[:creature]
+    creatures[..., state['energy']] = rng.choice(np.arange(65, 86), size=batch + (creature,), replace=True)
+    creatures[..., state['alive']] = True
+    return world, creatures
+
+
+def _cell_base(world):
+    # offset of each world's first cell in world.reshape(-1), shaped to broadcast against (..., creature)
+    batch = world.shape[:-2]
+    return (np.arange(int(np.prod(batch))) * world.shape[-2] * world.shape[-1]).reshape(batch + (1,))
+
+
+def look(world, creatures, eyesight):
+    """
+    sight inputs for 8 directions x 4 object types, 1 - 2*(j/eyesight) for the first object j cells past the neighbour
+    every living creature's sightlines, in every world, are gathered as one (creature, direction, distance) block of cells
+    the gather touches 8 * (eyesight-1) cells per creature wherever it stands, so sight costs the same in any size of world
+    (dead creatures see nothing, so the tail of a long step loop only pays for the survivors)
+    """
+    cols = world.shape[-1]
+    cells = world.reshape(-1)
+    crit = creatures.reshape(-1, 7)
+    base = np.broadcast_to(_cell_base(world), creatures.shape[:-1]).reshape(-1)
+    live = np.flatnonzero(crit[:, state['alive']])
+
+    # sightlines as flat cell offsets; borders are rock, so a line (straight or diagonal) is stopped by the border
+    # before any cell past it matters, and clipping only keeps the gather in bounds
+    dist = np.arange(1, eyesight)
+    offsets = sight_dy[:, None] * dist * cols + sight_dx[:, None] * dist
+    here = base[live] + crit[live, state['y']] * cols + crit[live, state['x']]
+    seen = cells[np.clip(here[:, None, None] + offsets, 0, len(cells) - 1)]
+
+    hit = seen != code['empty']
+    first = hit.argmax(axis=-1)
+    obj = np.take_along_axis(seen, first[..., None], axis=-1)[..., 0]
+
+    sight = np.zeros((len(crit), len(sight_dy), 4))
+    c, d = np.nonzero(hit.any(axis=-1))
+    sight[live[c], d, obj[c, d] - 1] = 1 - 2 * (first[c, d] / eyesight)
+    return sight.reshape(creatures.shape[:-1] + (4 * len(sight_dy),))
+
+
+def move(world, creatures, sim_age):
+    """
+    apply every living creature's action, updating creatures and world in place (both must be contiguous)
+    targets are judged against the world as it was at the start of the step; when several creatures
+    step into the same cell the lowest index wins and the rest bump, so the result doesn't depend on update order
+    """
+    cols = world.shape[-1]
+    cells = world.reshape(-1)
+    crit = creatures.reshape(-1, 7)
+    base = np.broadcast_to(_cell_base(world), creatures.shape[:-1]).reshape(-1)
+
+    alive = crit[:, state['alive']].astype(bool)
+    action = crit[:, state['action']]
+    y, x = crit[:, state['y']], crit[:, state['x']]
+    ty = y + action_dy[action]
+    tx = x + action_dx[action]
+    here = base + y * cols + x
+    dest = base + ty * cols + tx
+
+    moving = alive & (action != 0)
+    target = cells[dest]
+    free = moving & ((target == code['empty']) | (target == code['food']))
+
+    # first creature (lowest index) to claim each free cell wins it
+    claim = np.flatnonzero(free)
+    _, first = np.unique(dest[claim], return_index=True)
+    wins = np.zeros(len(crit), bool)
+    wins[claim[first]] = True
+    bumped = moving & ~wins
+    ate = wins & (target == code['food'])
+
+    cost = np.where(alive, 1, 0)
+    cost[bumped] = 2
+    cost[ate] = -25
+    crit[:, state['fitness']] += ate.astype(int) - bumped.astype(int)
+
+    cells[here[wins]] = code['empty']
+    crit[wins, state['y']] = ty[wins]
+    crit[wins, state['x']] = tx[wins]
+    here[wins] = dest[wins]
+    crit[:, state['energy']] -= cost
+
+    energy = crit[:, state['energy']]
+    died = alive & (energy <= 0)
+    cells[here[alive]] = np.where(energy > 50, code['creature'], np.where(energy > 0, code['weak'], code['food']))[alive]
+    crit[died, state['alive']] = False
+    crit[died, state['age']] = sim_age
+
+
+def render(world):
+    return '\n'.join(' '.join(row) for row in glyphs[world])
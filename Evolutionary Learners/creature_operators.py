@@ -0,0 +1,86 @@
+# creature_operators.py
+# selection and mutation operators for creature-evolution.py
+# fitness is (population, creature); selection returns the parent of every slot of the next generation,
+# (population, creature), and how many leading slots are kept as unmutated copies
+# mutation draws only the number of weights that mutate and scatters them, so its memory and RNG cost
+# follow the mutation rate rather than the parameter count
+
+import numpy as np
+
+
+def truncation(fitness, rng, survivors):
+    """
+    the top survivors by fitness, cloned in turn to fill the generation; the first clone of each is kept intact
+    """
+    n = fitness.shape[1]
+    top = np.argsort(fitness, axis=1, kind='quicksort')[:, -survivors:]
+    return top[:, np.arange(n) % survivors], survivors
+
+
+def tournament(fitness, rng, size=3, keep=0, parents=None):
+    """
+    each slot's parent is the fittest of `size` creatures drawn at random (with replacement)
+    slots before keep are left to the caller (their parents are given in `parents`)
+    """
+    n_pop, n = fitness.shape
+    entrants = rng.integers(0, n, size=(n_pop, (n - keep) * size))
+    scores = np.take_along_axis(fitness, entrants, axis=1).reshape(n_pop, n - keep, size)
+    entrants = entrants.reshape(n_pop, n - keep, size)
+    winners = np.take_along_axis(entrants, scores.argmax(axis=2)[..., None], axis=2)[..., 0]
+    if keep:
+        winners = np.concatenate([parents, winners], axis=1)
+    return winners, keep
+
+
+def elitist(fitness, rng, elite=2, size=3):
+    """
+    the top elite carried over unchanged, the rest of the generation filled by tournament
+    """
+    top = np.argsort(fitness, axis=1, kind='stable')[:, ::-1][:, :elite]
+    return tournament(fitness, rng, size, keep=elite, parents=top)
+
+
+def select(strategy, fitness, rng, survivors=10, tournament_size=3, elite=2):
+    if strategy == 'truncation':
+        return truncation(fitness, rng, survivors)
+    if strategy == 'tournament':
+        return tournament(fitness, rng, tournament_size)
+    if strategy == 'elitist':
+        return elitist(fitness, rng, elite, tournament_size)
+    raise ValueError(f"unknown selection strategy: {strategy}")
+
+
+def sparse_sites(shape, keep, chance, rng):
+    """
+    index tuple of the weights that mutate, each independently with probability chance,
+    over a (population, creature, ...) tensor excluding the first keep creatures
+    """
+    mutable = (shape[0], shape[1] - keep) + tuple(shape[2:])
+    n_sites = int(np.prod(mutable))
+    flat = np.empty(0, dtype=np.int64)
+    if n_sites and chance > 0:
+        # geometric gaps between successive sites, so only the sites themselves are drawn and stored
+        # (rng.choice without replacement allocates arange(n_sites) once k is more than a few % of n_sites)
+        n_draw = int(n_sites * chance + 4 * np.sqrt(n_sites * chance)) + 16
+        flat = rng.geometric(chance, size=n_draw)
+        np.cumsum(flat, out=flat) # 1-based positions of the sites, in order
+        while flat[-1] <= n_sites:
+            more = rng.geometric(chance, size=n_draw)
+            np.cumsum(more, out=more)
+            flat = np.concatenate([flat, more + flat[-1]])
+        flat = flat[:np.searchsorted(flat, n_sites, side='right')] - 1
+    sites = np.unravel_index(flat, mutable)
+    return (sites[0], sites[1] + keep) + sites[2:]
+
+
+def mutate(weights, keep, rng, chance_sm, max_amt_sm, chance_lg=0.0):
+    """
+    in place on a (population, creature, ...) weight tensor, sparing the first keep creatures
+    small mutations nudge a weight by up to +/- max_amt_sm, large mutations replace it with a fresh value in [-1, 1]
+    """
+    small = sparse_sites(weights.shape, keep, chance_sm, rng)
+    weights[small] += max_amt_sm * (2 * rng.random(len(small[0])) - 1)
+    if chance_lg:
+        large = sparse_sites(weights.shape, keep, chance_lg, rng)
+        weights[large] = 2 * rng.random(len(large[0])) - 1
+    return weights
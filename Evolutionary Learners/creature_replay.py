@@ -0,0 +1,76 @@
+# creature_replay.py
+# record watched generations of creature-evolution.py to a compact replay file, and play them back
+# a replay is the first frame of one world plus, per step, the cells that changed (flat index, new int8 code)
+# and the creature state (alive, energy, y, x), so recording costs one grid compare per step and no console I/O
+#
+# usage: python creature_replay.py <replay.npz> [fps]
+
+import os
+import sys
+import time
+import numpy as np
+
+import creature_engine as engine
+
+# creature state columns kept per step
+replay_cols = [engine.state[k] for k in ('alive', 'energy', 'y', 'x')]
+
+
+class ReplayRecorder():
+    def __init__(self, world, creatures, generation=0):
+        # world (rows, cols) and creatures (creature, 7) of a single world, as of the first step
+        self.generation = generation
+        self.first = world.copy()
+        self.prev = world.copy()
+        self.delta_idx, self.delta_val, self.delta_len = [], [], []
+        self.critters = [creatures[:, replay_cols].astype(np.int16)]
+
+    def step(self, world, creatures):
+        changed = np.flatnonzero(world != self.prev)
+        self.delta_idx.append(changed.astype(np.int32))
+        self.delta_val.append(world.reshape(-1)[changed])
+        self.delta_len.append(len(changed))
+        self.prev[...] = world
+        self.critters.append(creatures[:, replay_cols].astype(np.int16))
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        np.savez_compressed(path,
+            generation=self.generation,
+            first=self.first,
+            delta_idx=np.concatenate(self.delta_idx) if self.delta_idx else np.zeros(0, np.int32),
+            delta_val=np.concatenate(self.delta_val) if self.delta_val else np.zeros(0, np.int8),
+            delta_len=np.array(self.delta_len, np.int32),
+            creatures=np.stack(self.critters))
+
+
+def frames(path):
+    """
+    yield (step, world, creatures) for every recorded step, rebuilding the world from its deltas
+    """
+    with np.load(path) as replay:
+        world = replay['first'].copy()
+        cells = world.reshape(-1)
+        ends = np.cumsum(replay['delta_len'])
+        starts = ends - replay['delta_len']
+        delta_idx, delta_val, critters = replay['delta_idx'], replay['delta_val'], replay['creatures']
+    yield 0, world, critters[0]
+    for step, (start, end) in enumerate(zip(starts, ends)):
+        cells[delta_idx[start:end]] = delta_val[start:end]
+        yield step + 1, world, critters[step + 1]
+
+
+def play(path, fps=30):
+    generation = int(np.load(path)['generation'])
+    for step, world, critters in frames(path):
+        # home the cursor and clear with ANSI codes rather than a shell call per frame
+        sys.stdout.write('\x1b[H\x1b[2J' + 'Gen:' + str(generation) + ' Age:' + str(step + 1) +
+                         ' Alive:' + str(critters[:, 0].sum()) + '\n' + engine.render(world) + '\n')
+        sys.stdout.flush()
+        time.sleep(1 / fps)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        sys.exit('usage: python creature_replay.py <replay.npz> [fps]')
+    play(sys.argv[1], float(sys.argv[2]) if len(sys.argv) > 2 else 30)
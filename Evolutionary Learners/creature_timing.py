@@ -0,0 +1,78 @@
+# creature_timing.py
+# per-phase wall time for creature-evolution.py
+# phases are timed as laps: each lap() charges the time since the previous lap to the named phase,
+# so the step loop pays one perf_counter call per phase and the phases add up to the generation's wall time
+# rows are appended to a CSV per island, one per generation
+
+import os
+import csv
+import time
+
+phases = ('init', 'look', 'nn', 'move', 'record', 'select', 'clone', 'mutate', 'migrate', 'checkpoint')
+
+
+class PhaseTimer():
+    def __init__(self):
+        self.seconds = dict.fromkeys(phases, 0.0)
+        self.steps = 0
+        self.t0 = time.perf_counter()
+
+    def start(self):
+        for k in self.seconds:
+            self.seconds[k] = 0.0
+        self.steps = 0
+        self.t0 = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.seconds[phase] += now - self.t0
+        self.t0 = now
+
+    def row(self, **fields):
+        row = dict(fields, steps=self.steps)
+        row.update({f"{k}_s": round(v, 6) for k, v in self.seconds.items()})
+        row['total_s'] = round(sum(self.seconds.values()), 6)
+        return row
+
+
+class PhaseLog():
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.header = not os.path.exists(path) or os.path.getsize(path) == 0
+
+    def write(self, row):
+        with open(self.path, 'a', newline='') as f:
+            out = csv.DictWriter(f, fieldnames=list(row))
+            if self.header:
+                out.writeheader()
+                self.header = False
+            out.writerow(row)
+
+
+def start_profiler(kind):
+    """
+    optional sampling profiler for the main process: 'pyinstrument', or None
+    returns a profiler to pass to stop_profiler, or None when unavailable
+    """
+    if kind != 'pyinstrument':
+        return None
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        print('pyinstrument not installed, profiling disabled')
+        return None
+    profiler = Profiler()
+    profiler.start()
+    return profiler
+
+
+def stop_profiler(profiler, path=None):
+    if profiler is None:
+        return
+    profiler.stop()
+    if path:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(profiler.output_html())
+    print(profiler.output_text(unicode=True))
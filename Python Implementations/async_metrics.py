@@ -0,0 +1,158 @@
+##################################################
+# async_metrics.py
+# latency histograms and throughput counters for the async dispatchers and pipeline stages
+#
+# - Histogram is HDR-style: log-linear buckets over integer microseconds, 64 sub-buckets per power of two,
+#   so any recorded value is kept to within ~1.6% in a fixed few KB, and recording is O(1) with no allocation
+# - Metrics tracks one flow of tasks: queue wait (submitted -> started), service time (started -> finished)
+#   and end-to-end latency, plus in-flight count, completions, failures and throughput
+# - SnapshotWriter appends a JSON line per Metrics every `interval` seconds while a job runs, and a last one at the end
+#
+# usage:
+#   m = Metrics('dispatcher')
+#   t = m.submit(); s = m.start(t); ...; m.finish(t, s, ok=True)
+#   async with SnapshotWriter([m], 'metrics/dispatcher.jsonl', interval=1.0): ...
+
+import asyncio, json, os, time
+import typing as tp
+
+
+class Histogram():
+    sub_bits = 7 # 2**7 linear buckets below 128us, then 64 per power of two
+    n_buckets = 64 * 40 # up to ~2**39us (6 days); anything longer lands in the last bucket
+
+    def __init__(self):
+        self.counts = [0] * self.n_buckets
+        self.n = 0
+        self.total = 0
+        self.max = 0
+
+    def _index(self, v):
+        if v < 2 ** self.sub_bits:
+            return v
+        e = v.bit_length() - self.sub_bits
+        return min((e << (self.sub_bits - 1)) + (v >> e), self.n_buckets - 1)
+
+    @staticmethod
+    def _value(index):
+        # midpoint of the bucket, in microseconds
+        if index < 2 ** Histogram.sub_bits:
+            return index
+        e = index // 64 - 1
+        return ((index - e * 64) << e) + (1 << (e - 1))
+
+    def record(self, seconds):
+        v = max(0, int(seconds * 1e6))
+        self.counts[self._index(v)] += 1
+        self.n += 1
+        self.total += v
+        self.max = max(self.max, v)
+
+    def percentile(self, q) -> float:
+        # seconds; 0.0 when empty
+        if not self.n:
+            return 0.0
+        rank = max(1, int(q / 100 * self.n + 0.5))
+        seen = 0
+        for index, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return min(self._value(index), self.max) / 1e6
+        return self.max / 1e6
+
+    def summary(self, prefix) -> dict:
+        return {f"{prefix}_p50": self.percentile(50), f"{prefix}_p95": self.percentile(95),
+                f"{prefix}_p99": self.percentile(99), f"{prefix}_max": self.max / 1e6,
+                f"{prefix}_mean": self.total / self.n / 1e6 if self.n else 0.0}
+
+
+class Metrics():
+    def __init__(self, name):
+        self.name = name
+        self.queue_wait = Histogram()
+        self.service = Histogram()
+        self.latency = Histogram()
+        self.submitted = 0
+        self.in_flight = 0
+        self.done = 0
+        self.failed = 0
+        self.started_at = time.perf_counter()
+        self._last = (self.started_at, 0)
+
+    def submit(self) -> float:
+        self.submitted += 1
+        return time.perf_counter()
+
+    def start(self, submitted) -> float:
+        now = time.perf_counter()
+        self.queue_wait.record(now - submitted)
+        self.in_flight += 1
+        return now
+
+    def finish(self, submitted, started, ok=True):
+        now = time.perf_counter()
+        self.service.record(now - started)
+        self.latency.record(now - submitted)
+        self.in_flight -= 1
+        if ok:
+            self.done += 1
+        else:
+            self.failed += 1
+
+    def snapshot(self) -> dict:
+        """
+        counts so far, throughput overall and since the previous snapshot, and latency percentiles in seconds
+        """
+        now = time.perf_counter()
+        finished = self.done + self.failed
+        last_t, last_n = self._last
+        self._last = (now, finished)
+        elapsed = now - self.started_at
+        snap = dict(name=self.name, ts=time.time(), elapsed_s=round(elapsed, 3), submitted=self.submitted,
+                    in_flight=self.in_flight, done=self.done, failed=self.failed,
+                    per_s=round(finished / elapsed, 2) if elapsed else 0.0,
+                    recent_per_s=round((finished - last_n) / (now - last_t), 2) if now > last_t else 0.0)
+        for prefix, hist in (('wait', self.queue_wait), ('service', self.service), ('latency', self.latency)):
+            snap.update(hist.summary(prefix))
+        return snap
+
+    def percentiles(self, digits=4) -> dict:
+        # p50/p95/p99 of queue wait, service time and latency, for reports
+        out = dict()
+        for prefix, hist in (('wait', self.queue_wait), ('service', self.service), ('latency', self.latency)):
+            out.update({k: round(v, digits) for k, v in hist.summary(prefix).items() if k[-3:] in ('p50', 'p95', 'p99')})
+        return out
+
+
+class SnapshotWriter():
+    """
+    async context manager; with path None it writes nothing, so callers can keep one code path
+    """
+    def __init__(self, metrics: tp.List[Metrics], path, interval=1.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._task = None
+
+    def write(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a') as f:
+            for m in self.metrics:
+                f.write(json.dumps(m.snapshot()) + '\n')
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.write()
+
+    async def __aenter__(self):
+        if self.path:
+            self._task = asyncio.create_task(self._loop())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self._task is not None:
+            self._task.cancel()
+        self.write()
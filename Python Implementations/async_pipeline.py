@@ -0,0 +1,161 @@
+##################################################
+# async_pipeline.py
+# multi-stage asyncio pipeline: each stage is a pool of workers reading a bounded queue and feeding the next stage
+#
+# - bounded queues give backpressure: a full stage blocks its producers on put() instead of anyone polling
+# - workers block on get(), so an idle pipeline costs nothing and an item starts as soon as a worker is free
+# - shutdown is by sentinel: when the feed is exhausted every worker of the first stage gets one stop item,
+#   and when the last worker of a stage exits the next stage gets one per worker, so stages drain in order
+# - a failing item is retried with exponential backoff and jitter up to max_attempts, then recorded as failed
+# - each stage has an async_metrics.Metrics: queue wait runs from an item being ready for the stage (including any
+#   time its producer spent blocked on the full queue) to a worker taking it, service time covers every attempt
+# - a cpu_bound stage takes a plain (picklable, module-level) function and runs it in a process pool through
+#   hybrid_executor.HybridExecutor, so its workers wait on the pool while I/O stages keep the loop
+#
+# usage:
+#   pipe = Pipeline([Stage('extract', extract, workers=3), Stage('load', load, workers=4, max_attempts=5)])
+#   report = asyncio.run(pipe.run(items))
+
+import asyncio, random, sys, time
+import logging
+import typing as tp
+
+from async_metrics import Metrics, SnapshotWriter
+from hybrid_executor import HybridExecutor
+
+logger = logging.getLogger('py_logs')
+
+_stop = object() # sentinel: one per worker, never passed to a stage function
+
+
+class Stage():
+    def __init__(self, name, fn: tp.Callable[[tp.Any], tp.Awaitable], workers=1, maxsize=None,
+                 max_attempts=1, backoff=0.5, backoff_max=30.0, retry_on=(Exception,), cpu_bound=None):
+        """
+        fn is awaited once per item and its result is passed to the next stage
+        cpu_bound (default: fn marked with hybrid_executor.cpu_bound) runs fn in the process pool instead; the item is
+        pickled across, so fn must return what it changes
+        maxsize bounds the stage's input queue (default: twice the workers)
+        an item raising one of retry_on is retried after backoff * 2**(attempt-1) seconds (capped, with jitter)
+        """
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.maxsize = maxsize if maxsize is not None else 2 * workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.retry_on = retry_on
+        self.cpu_bound = cpu_bound if cpu_bound is not None else getattr(fn, 'cpu_bound', False)
+
+    def delay(self, attempt):
+        return min(self.backoff * 2 ** (attempt - 1), self.backoff_max) * random.uniform(0.5, 1.0)
+
+
+class Pipeline():
+    def __init__(self, stages: tp.List[Stage], metrics_file=None, metrics_interval=1.0, processes=None, window=None):
+        """
+        metrics_file, if given, gets a JSON line snapshot per stage every metrics_interval seconds during run()
+        processes and window size the process pool shared by cpu_bound stages (see HybridExecutor)
+        """
+        self.stages = stages
+        self.processes = processes
+        self.window = window
+        self.executor = None
+        self.metrics_file = metrics_file
+        self.metrics_interval = metrics_interval
+        self.metrics = dict()
+
+    async def _call(self, stage: Stage, item):
+        """
+        run one item through a stage with retries; returns (ok, result or exception, attempts)
+        """
+        for attempt in range(1, stage.max_attempts + 1):
+            try:
+                if stage.cpu_bound:
+                    return True, await self.executor.submit(stage.fn, item, cpu_bound=True), attempt
+                return True, await stage.fn(item), attempt
+            except stage.retry_on as e:
+                if attempt == stage.max_attempts:
+                    logger.warning(f"{stage.name} failed on {item!r} after {attempt} attempts: {e!r}")
+                    return False, e, attempt
+                logger.debug(f"{stage.name} retrying {item!r} after attempt {attempt}: {e!r}")
+                await asyncio.sleep(stage.delay(attempt))
+
+    async def _worker(self, k, worker_id, queues, report):
+        stage = self.stages[k]
+        inbox = queues[k]
+        outbox = queues[k + 1] if k + 1 < len(queues) else None
+        counts = report['stages'][stage.name]
+        metrics = self.metrics[stage.name]
+        while True:
+            entry = await inbox.get()
+            if entry is _stop:
+                inbox.task_done()
+                return
+            submitted, item = entry
+            start = metrics.start(submitted)
+            ok, result, attempts = await self._call(stage, item)
+            metrics.finish(submitted, start, ok)
+            counts['busy_s'] += time.perf_counter() - start
+            counts['attempts'] += attempts
+            if not ok:
+                counts['failed'] += 1
+                report['failed'].append((stage.name, item, result))
+            else:
+                counts['done'] += 1
+                if outbox is not None:
+                    # blocks while the next stage is full
+                    await outbox.put((self.metrics[self.stages[k + 1].name].submit(), result))
+                else:
+                    report['results'].append(result)
+            inbox.task_done()
+
+    async def _close_after(self, k, workers, queues):
+        # once every worker of stage k is done, stop the workers of stage k+1
+        await asyncio.gather(*workers)
+        if k + 1 < len(self.stages):
+            for _ in range(self.stages[k + 1].workers):
+                await queues[k + 1].put(_stop)
+
+    async def _feed(self, items, inbox):
+        metrics = self.metrics[self.stages[0].name]
+        for item in items:
+            await inbox.put((metrics.submit(), item)) # blocks while the first stage is full
+        for _ in range(self.stages[0].workers):
+            await inbox.put(_stop)
+
+    async def run(self, items: tp.Iterable) -> dict:
+        """
+        feed items through every stage; returns the last stage's results, the failures (stage, item, error),
+        per-stage counts with wait/service/latency percentiles, and wall time
+        """
+        self.metrics = {s.name: Metrics(s.name) for s in self.stages}
+        if any(s.cpu_bound for s in self.stages):
+            self.executor = await HybridExecutor(self.processes, self.window).__aenter__()
+        queues = [asyncio.Queue(maxsize=stage.maxsize) for stage in self.stages]
+        report = dict(results=[], failed=[], stages={s.name: dict(done=0, failed=0, attempts=0, busy_s=0.0)
+                                                     for s in self.stages})
+        start = time.perf_counter()
+        workers = [[asyncio.create_task(self._worker(k, i, queues, report), name=f"{stage.name}-{i}")
+                    for i in range(stage.workers)]
+                   for k, stage in enumerate(self.stages)]
+        closers = [asyncio.create_task(self._close_after(k, w, queues)) for k, w in enumerate(workers)]
+        feeder = asyncio.create_task(self._feed(items, queues[0]))
+        try:
+            async with SnapshotWriter(list(self.metrics.values()), self.metrics_file, self.metrics_interval):
+                # a worker that dies outright fails its closer; stop then rather than leave the feeder blocked on a full queue
+                done, _ = await asyncio.wait([feeder] + closers, return_when=asyncio.FIRST_EXCEPTION)
+                for task in done:
+                    task.result()
+        finally:
+            feeder.cancel()
+            for task in [t for w in workers for t in w] + closers:
+                task.cancel()
+            if self.executor is not None:
+                await self.executor.__aexit__(*sys.exc_info())
+                self.executor = None
+        for name, m in self.metrics.items():
+            report['stages'][name].update(m.percentiles())
+        report['elapsed_s'] = time.perf_counter() - start
+        return report
@@ -0,0 +1,261 @@
+##################################################
+# http_dispatcher.py
+# async HTTP request dispatcher: the queued_requests pattern against a real service
+#
+# - one pooled aiohttp session per dispatcher, so connections are reused (keep-alive) across requests
+# - a token bucket caps the request rate, alongside a concurrency cap (fixed, or queued_requests.AdaptiveLimiter)
+# - per-request timeout; timeouts, connection errors, 429 and 5xx are retried with backoff (honouring Retry-After)
+# - response bodies are streamed chunk by chunk to a sink, never buffered whole
+# - a fixed pool of worker coroutines pulls requests from an iterator, so a million requests cost a million
+#   iterations rather than a million pending tasks
+# - async_metrics.Metrics per dispatcher: queue wait is the time from a worker taking a request to its first attempt
+#   clearing the rate and concurrency gates; service time runs from there to the last attempt, retries included
+#
+# stand-in server for tests and benchmarks: serve_stub() (aiohttp.web), run in its own process by bench()
+#
+# usage: python http_dispatcher.py [n_requests] [concurrency] [rate per second]
+
+import asyncio, multiprocessing, os, random, sys, time
+import logging
+import typing as tp
+
+import aiohttp
+from aiohttp import web
+
+from async_metrics import Metrics, SnapshotWriter
+
+logger = logging.getLogger('py_logs')
+
+retry_status = {429, 500, 502, 503, 504}
+
+
+class RetryStatus(Exception):
+    def __init__(self, status, retry_after=None):
+        super().__init__(status)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class TokenBucket():
+    """
+    `rate` tokens per second, up to `burst` saved; acquire() waits until a token is available
+    """
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate / 10)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock: # one waiter at a time keeps the grant order fair
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class Request():
+    def __init__(self, id, url, method='GET', params=None, json=None, headers=None):
+        self.id = id
+        self.url = url
+        self.method = method
+        self.params = params
+        self.json = json
+        self.headers = headers
+
+
+class CountingSink():
+    """
+    default sink: drains each body and counts bytes and statuses
+    """
+    def __init__(self):
+        self.bytes = 0
+        self.status = dict()
+
+    async def __call__(self, request: Request, response: aiohttp.ClientResponse):
+        async for chunk in response.content.iter_chunked(2**16):
+            self.bytes += len(chunk)
+        self.status[response.status] = self.status.get(response.status, 0) + 1
+
+    async def close(self):
+        pass
+
+
+class FileSink(CountingSink):
+    """
+    streams every 2xx body to its own file, out_dir/<request id>, chunk by chunk
+    """
+    def __init__(self, out_dir):
+        super().__init__()
+        self.out_dir = out_dir
+        os.makedirs(out_dir, exist_ok=True)
+
+    async def __call__(self, request: Request, response: aiohttp.ClientResponse):
+        with open(os.path.join(self.out_dir, str(request.id)), 'wb') as f:
+            async for chunk in response.content.iter_chunked(2**16):
+                f.write(chunk)
+                self.bytes += len(chunk)
+        self.status[response.status] = self.status.get(response.status, 0) + 1
+
+
+class HttpDispatcher():
+    def __init__(self, concurrency=64, rate=None, timeout=10.0, max_attempts=3, backoff=0.1, backoff_max=5.0,
+                 limiter=None, sink=None, connector_limit=None, metrics=None):
+        """
+        concurrency is the number of worker coroutines (and the most requests in flight)
+        rate caps requests per second across all workers (None for no cap)
+        limiter, e.g. queued_requests.AdaptiveLimiter, additionally gates each attempt on a slot
+        """
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(rate) if rate else None
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.limiter = limiter
+        self.sink = sink or CountingSink()
+        self.connector_limit = connector_limit or concurrency
+        self.session = None
+        self.stats = dict(done=0, failed=0, attempts=0, retries=0)
+        self.metrics = metrics or Metrics('http')
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.connector_limit, ttl_dns_cache=300)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+        await self.sink.close()
+
+    def _delay(self, attempt, retry_after=None):
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return min(self.backoff * 2 ** (attempt - 1), self.backoff_max) * random.uniform(0.5, 1.0)
+
+    async def _send(self, request: Request):
+        async with self.session.request(request.method, request.url, params=request.params, json=request.json,
+                                        headers=request.headers) as response:
+            if response.status in retry_status:
+                await response.read()
+                raise RetryStatus(response.status, response.headers.get('Retry-After'))
+            await self.sink(request, response)
+
+    async def _attempt(self, request: Request, clock):
+        # clock is [submitted, started]; started is set once the first attempt is through the gates
+        if self.bucket is not None:
+            await self.bucket.acquire()
+        if self.limiter is None:
+            clock[1] = clock[1] or self.metrics.start(clock[0])
+            return await self._send(request)
+        async with self.limiter.slot(): # a retryable status counts as an error for the limiter
+            clock[1] = clock[1] or self.metrics.start(clock[0])
+            return await self._send(request)
+
+    async def fetch(self, request: Request) -> bool:
+        clock = [self.metrics.submit(), None]
+        for attempt in range(1, self.max_attempts + 1):
+            self.stats['attempts'] += 1
+            retry_after = None
+            try:
+                await self._attempt(request, clock)
+                self.stats['done'] += 1
+                self.metrics.finish(*clock)
+                return True
+            except RetryStatus as e:
+                retry_after, error = e.retry_after, f"status {e.status}"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = repr(e)
+            if attempt == self.max_attempts:
+                break
+            self.stats['retries'] += 1
+            await asyncio.sleep(self._delay(attempt, retry_after))
+        logger.warning(f"request {request.id} failed after {self.max_attempts} attempts: {error}")
+        self.stats['failed'] += 1
+        self.metrics.finish(*clock, ok=False)
+        return False
+
+    async def _worker(self, requests: tp.Iterator[Request]):
+        for request in requests: # workers share one iterator, each takes the next request when free
+            await self.fetch(request)
+
+    async def run(self, requests: tp.Iterable[Request], metrics_file=None, metrics_interval=1.0) -> dict:
+        """
+        metrics_file, if given, gets a JSON line snapshot of self.metrics every metrics_interval seconds
+        """
+        requests = iter(requests)
+        start = time.perf_counter()
+        async with SnapshotWriter([self.metrics], metrics_file, metrics_interval):
+            await asyncio.gather(*[self._worker(requests) for _ in range(self.concurrency)])
+        elapsed = time.perf_counter() - start
+        done = self.stats['done'] + self.stats['failed']
+        return dict(self.stats, elapsed_s=round(elapsed, 3), per_s=round(done / elapsed, 1) if elapsed else None,
+                    bytes=self.sink.bytes, status=dict(self.sink.status), **self.metrics.percentiles())
+
+
+##### stand-in server
+
+def stub_app(latency=0.0, error_rate=0.0, body_bytes=256):
+    body = b'x' * body_bytes
+    async def handle(request):
+        if latency:
+            await asyncio.sleep(latency * random.uniform(0.5, 1.5))
+        if error_rate and random.random() < error_rate:
+            return web.Response(status=503, headers={'Retry-After': '0.05'})
+        return web.Response(body=body, content_type='application/octet-stream')
+    app = web.Application()
+    app.router.add_get('/item/{id}', handle)
+    return app
+
+
+def serve_stub(port=8089, latency=0.0, error_rate=0.0, body_bytes=256):
+    web.run_app(stub_app(latency, error_rate, body_bytes), host='127.0.0.1', port=port, print=None,
+                access_log=None)
+
+
+async def _wait_for_port(port, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+
+
+def bench(n_requests=20_000, concurrency=128, rate=None, port=8089, latency=0.0, error_rate=0.0,
+          metrics_file='metrics/http_dispatcher.jsonl'):
+    """
+    start the stub server in its own process, then dispatch n_requests at it from this one
+    """
+    server = multiprocessing.Process(target=serve_stub, args=(port, latency, error_rate), daemon=True)
+    server.start()
+    try:
+        async def main():
+            await _wait_for_port(port)
+            requests = (Request(i, f"http://127.0.0.1:{port}/item/{i}") for i in range(n_requests))
+            async with HttpDispatcher(concurrency=concurrency, rate=rate) as dispatcher:
+                return await dispatcher.run(requests, metrics_file)
+        report = asyncio.run(main())
+    finally:
+        server.terminate()
+        server.join()
+    logger.info(report)
+    return report
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='py_logs: %(asctime)s - %(levelname)s  %(message)s')
+    args = [int(a) for a in sys.argv[1:4]]
+    print(bench(*args))
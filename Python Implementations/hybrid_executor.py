@@ -0,0 +1,127 @@
+##################################################
+# hybrid_executor.py
+# one asyncio coordinator for mixed work: coroutines (I/O) run on the event loop, CPU-bound functions run in a
+# process pool through run_in_executor, so a long computation never stalls the loop's I/O
+#
+# - a function is CPU-bound when decorated with @cpu_bound, or when submitted with cpu_bound=True;
+#   it must be a plain module-level function (picklable), and its arguments and result are pickled across
+# - a bounded submission window (a semaphore, default 2 per process) caps CPU jobs handed to the pool, so callers
+#   wait at the window instead of piling pickled jobs into the pool's unbounded internal queue
+# - the pool is created on __aenter__ and shut down on __aexit__
+#
+# usage:
+#   @cpu_bound
+#   def score(item): ...
+#   async with HybridExecutor() as ex:
+#       data = await ex.submit(fetch, url)   # coroutine function, awaited on the loop
+#       s = await ex.submit(score, data)     # sent to a worker process
+#
+# bench: python hybrid_executor.py [n_tasks] -- the same mixed workload on the loop only, then hybrid
+
+import asyncio, functools, os, sys, time
+import concurrent.futures as cf
+import logging
+
+logger = logging.getLogger('py_logs')
+
+
+def cpu_bound(fn):
+    # marks fn for the process pool; the function itself is returned, so it still pickles by name
+    fn.cpu_bound = True
+    return fn
+
+
+class HybridExecutor():
+    def __init__(self, processes=None, window=None, initializer=None, initargs=()):
+        self.processes = processes or os.cpu_count() or 1
+        self.window = window or 2 * self.processes
+        self.initializer = initializer
+        self.initargs = initargs
+        self.pool = None
+        self.stats = dict(cpu=0, io=0, window_wait_s=0.0)
+        self._window = None
+
+    async def __aenter__(self):
+        self.pool = cf.ProcessPoolExecutor(max_workers=self.processes, initializer=self.initializer,
+                                           initargs=self.initargs)
+        self._window = asyncio.Semaphore(self.window)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.pool.shutdown(wait=exc_type is None, cancel_futures=exc_type is not None)
+
+    async def submit(self, fn, *args, cpu_bound=None, **kwargs):
+        """
+        await fn(*args, **kwargs) on the loop, or run it in the pool when it is CPU-bound
+        """
+        if cpu_bound is None:
+            cpu_bound = getattr(fn, 'cpu_bound', False)
+        if not cpu_bound:
+            self.stats['io'] += 1
+            return await fn(*args, **kwargs)
+        start = time.perf_counter()
+        async with self._window:
+            self.stats['window_wait_s'] += time.perf_counter() - start
+            self.stats['cpu'] += 1
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.pool, functools.partial(fn, *args, **kwargs))
+
+
+##### bench
+
+@cpu_bound
+def crunch(n):
+    # stand-in CPU stage: pure Python arithmetic, holds the GIL throughout
+    acc = 0
+    for i in range(n):
+        acc = (acc * 31 + i) % 1_000_003
+    return acc
+
+
+async def fetch(t):
+    await asyncio.sleep(t)
+    return t
+
+
+async def _loop_lag(stop, every=0.01):
+    # worst delay of a timer that should fire every `every` seconds: how long the loop was blocked
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(every)
+        worst = max(worst, time.perf_counter() - start - every)
+    return worst
+
+
+def bench(n_tasks=40, io_s=0.05, cpu_n=300_000, processes=None):
+    """
+    n_tasks of fetch-then-crunch, with every CPU step either run inline on the loop or sent to the pool
+    """
+    rows = []
+    for mode in ('loop', 'hybrid'):
+        async def main():
+            stop = asyncio.Event()
+            lag = asyncio.create_task(_loop_lag(stop))
+            async with HybridExecutor(processes) as ex:
+                async def one(i):
+                    await ex.submit(fetch, io_s)
+                    if mode == 'loop':
+                        return crunch(cpu_n)
+                    return await ex.submit(crunch, cpu_n)
+                start = time.perf_counter()
+                await asyncio.gather(*[one(i) for i in range(n_tasks)])
+                elapsed = time.perf_counter() - start
+            stop.set()
+            return elapsed, await lag, ex
+        elapsed, lag, ex = asyncio.run(main())
+        rows.append(dict(mode=mode, processes=ex.processes, seconds=round(elapsed, 3), max_loop_lag_s=round(lag, 3),
+                         cpu=ex.stats['cpu'], io=ex.stats['io'], window_wait_s=round(ex.stats['window_wait_s'], 3)))
+    for row in rows:
+        logger.info(row)
+    return rows
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='py_logs: %(asctime)s - %(levelname)s  %(message)s')
+    args = [int(a) for a in sys.argv[1:2]]
+    bench(*args)
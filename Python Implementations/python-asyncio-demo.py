@@ -4,13 +4,17 @@
 import random, time, asyncio
 import logging
 
+from async_pipeline import Pipeline, Stage
+from hybrid_executor import cpu_bound
+
 class Task():
-    def __init__(self, name, success=None, attempts=None, time_extract=None, time_loading=None): 
+    def __init__(self, name, success=None, attempts=None, time_extract=None, time_loading=None, time_transform=None): 
         self.name = name
         self.success = success
         self.attempts = attempts
         self.time_extract = time_extract
         self.time_loading = time_loading
+        self.time_transform = time_transform
 
 
 async def random_job(name='random_job', prob=1.0, max_attempts=1, avg=10.0, sd=None):
@@ -37,111 +41,63 @@ async def random_job(name='random_job', prob=1.0, max_attempts=1, avg=10.0, sd=N
     return tsk
 
 
-async def extract_worker(a_queue, b_queue, worker_id):
-    print(f'hit extract, queue {a_queue.qsize()} -> queue {b_queue.qsize()}')
-    task_count = 0
-    work_time = 0.0
-    start_flag = False
-    while (not start_flag):
-        await asyncio.sleep(2)
-        start_flag = a_queue.full()
-        print(f'extract wait, queue {a_queue.qsize()}')
-    print(f"Extract_{worker_id} starting")
-    while (start_flag) and (not a_queue.empty()):
-        extract_task = await a_queue.get()
-        print(f"Extract_{worker_id} picked up {extract_task.name}")
-        # do work
-        start = time.perf_counter()
-        data = await asyncio.gather(random_job(extract_task.name, avg=9, sd=5))
-        elapsed_ext = round(time.perf_counter() - start, ndigits=1)
-        extract_task.time_ext = elapsed_ext
-        task_count += 1
-        work_time += elapsed_ext
-        print(f'{extract_task.name} extracted in {elapsed_ext} seconds')
-        # pass to next queue when there is space
-        if b_queue.full():
-            await b_queue.put(extract_task)
-        else:
-            b_queue.put_nowait(extract_task)
-        elapsed_wait = round(time.perf_counter() - start - elapsed_ext, ndigits=1)
-        print(f"\n{extract_task.name} added to queue after {elapsed_wait} seconds waiting; {a_queue.qsize()} extract jobs queued")
-        await asyncio.sleep(1) # take a break 
-    print(f"Extract_{worker_id} quitting")
-    return (worker_id, task_count, work_time)
-
-
-async def loading_worker(a_queue, worker_id, log):
-    print(f'hit loading')
-    task_count = 0
-    work_time = 0.0
-    start_flag = False
-    while not start_flag:
-        await asyncio.sleep(2)
-        start_flag = a_queue.full()
-        print(f'loading wait, queue {a_queue.qsize()}')
-    print(f"Loading_{worker_id} starting")
-    while (not a_queue.empty()):
-        load_task = await a_queue.get()
-        print(f"Loading_{worker_id} picked up {load_task.name}\n")
-        # do work
-        start = time.perf_counter()
-        data = await asyncio.gather(random_job(load_task.name, prob=0.66, max_attempts=5, avg=12, sd=4))
-        elapsed_load = round(time.perf_counter() - start, ndigits=1)
-        load_task.time_load = elapsed_load
-        task_count += 1
-        work_time += elapsed_load
-        print(f'{load_task.name} extracted in {elapsed_load} seconds')
-        # log results and release the task when done
-        log.append(load_task)
-        a_queue.task_done()
-        await asyncio.sleep(1) # take a break 
-        print(f"Loading_{worker_id} ready, queued: {a_queue.qsize()}")
-    print(f"Loading_{worker_id} quitting")
-    return (worker_id, task_count, work_time)
-
-
-async def queue_random_tasks(n_tasks=20, extract_names=[chr(i) for i in range(97,100)], loading_names=[chr(i) for i in range(122,118,-1)]):
-    print(f'{n_tasks} tasks')
-    a_queue = asyncio.Queue(maxsize=min(len(extract_names), n_tasks))
-    b_queue = asyncio.Queue(maxsize=min(len(loading_names), n_tasks))
-    print(f'Extract workers: {extract_names} \nLoading workers: {loading_names} \nStarting ... \n')
-    #
-    tasks = [f'task-{i}' for i in range(n_tasks)]
-    task_logs = []
+class LoadError(Exception):
+    pass
+
+
+async def extract(task: Task):
     start = time.perf_counter()
-    print('start timer')
-    extract_jobs = [asyncio.create_task(extract_worker(a_queue, b_queue, id)) for id in extract_names]
-    loading_jobs = [asyncio.create_task(loading_worker(b_queue, id, log=task_logs)) for id in loading_names]
-    print('workers created')
-    for tsk in tasks:
-        if (not a_queue.full()):
-            a_queue.put_nowait(tsk)
-        else: 
-            await a_queue.put(tsk)
-        print('.', end='')
-    print('tasks queued')
-    extract_report = await asyncio.gather(*extract_jobs, return_exceptions=True) 
-    loading_report = await asyncio.gather(*loading_jobs, return_exceptions=True) 
-    a_queue.join()  # implicitly waits until queue is cleared
-    b_queue.join()
-    elapsed = round(time.perf_counter() - start, ndigits=0)
-    print('\nJobs done')
-    #
-    for e in extract_jobs: 
-        e.cancel()
-    for l in loading_jobs: 
-        l.cancel()
-    print('Workers released')
-    results = sum([lg.success for lg in task_logs])
-    # return logged information
-    print(f'Completed queue of tasks in {elapsed} seconds clock-time')
-    print(results + ' of ' + n_tasks + 'tasks succeeded')
-    print(extract_report)
-    print(loading_report)
+    data = await random_job(task.name, avg=9, sd=5)
+    task.time_extract = round(time.perf_counter() - start, ndigits=1)
+    print(f'{task.name} extracted in {task.time_extract} seconds')
+    return task
+
 
+@cpu_bound
+def transform(task: Task, avg=2_000_000):
+    # real CPU work rather than a sleep: runs in a worker process, so it returns the task it changed
+    start = time.perf_counter()
+    acc = 0
+    for i in range(int(avg * random.uniform(0.5, 1.5))):
+        acc = (acc * 31 + i) % 1_000_003
+    task.time_transform = round(time.perf_counter() - start, ndigits=1)
+    print(f'{task.name} transformed in {task.time_transform} seconds')
+    return task
+
+
+async def load(task: Task):
+    # one attempt per call; the pipeline retries failed loads with backoff
+    start = time.perf_counter()
+    data = await random_job(task.name, prob=0.66, max_attempts=1, avg=12, sd=4)
+    task.attempts = (task.attempts or 0) + 1
+    task.time_loading = round((task.time_loading or 0.0) + time.perf_counter() - start, ndigits=1)
+    if not data['success']:
+        raise LoadError(f'{task.name} failed to load')
+    task.success = True
+    print(f'{task.name} loaded in {task.time_loading} seconds')
+    return task
 
-# test
-#asyncio.run(random_job())
 
-asyncio.run(queue_random_tasks(n_tasks=20, extract_names=['W','X','Y'], loading_names=['Thomas','Terry','Teng','Dweit']))
+async def queue_random_tasks(n_tasks=20, extract_workers=3, loading_workers=4, transform_workers=2,
+                             metrics_file='metrics/asyncio_demo.jsonl'):
+    print(f'{n_tasks} tasks')
+    print(f'Extract workers: {extract_workers} \nTransform workers: {transform_workers} \nLoading workers: {loading_workers} \nStarting ... \n')
+    pipe = Pipeline([
+        Stage('extract', extract, workers=extract_workers),
+        Stage('transform', transform, workers=transform_workers), # cpu_bound: runs in the process pool
+        Stage('load', load, workers=loading_workers, max_attempts=5, backoff=1.0),
+    ], metrics_file=metrics_file)
+    tasks = (Task(f'task-{i}') for i in range(n_tasks))
+    report = await pipe.run(tasks)
+    print('\nJobs done')
+    print(f"Completed queue of tasks in {round(report['elapsed_s'], ndigits=0)} seconds clock-time")
+    print(f"{len(report['results'])} of {n_tasks} tasks succeeded")
+    for name, counts in report['stages'].items():
+        print(name, counts)
+    return report
+
 
+if __name__ == '__main__':
+    # test
+    #asyncio.run(random_job())
+    asyncio.run(queue_random_tasks(n_tasks=20, extract_workers=3, loading_workers=4, transform_workers=2))
@@ -3,6 +3,8 @@ import logging, sys
 from random import random as urand
 import time, math 
 
+from async_metrics import Metrics, SnapshotWriter
+
 logger = logging.getLogger('py_logs')
 logger.setLevel(logging.INFO)
 handler = logging.StreamHandler(stream=sys.stdout)
@@ -21,30 +23,37 @@ config_qmax = 3
 config_n_batches = 5
 config_n_steps = 13
 config_dur = 2 
+config_metrics_file = 'metrics/queued_requests.jsonl' # periodic snapshots, one JSON line per dispatcher; None to skip
+config_metrics_interval = 1.0
 def noise_fn(): return round(urand() - 0.5, ndigits=1)
 
 
-async def worker(q, b, s, d): 
+async def worker(q, b, s, d, metrics): 
+    submitted = metrics.submit()
     async with q: 
-        logger.debug(f"+ worker {b}-{s}, q lock: {q._value}")
+        started = metrics.start(submitted)
+        logger.debug(f"+ worker {b}-{s}, in flight: {metrics.in_flight}")
         dur = d #+ noise_fn()
         await asyncio.sleep(dur) 
-    logger.debug(f"- worker {b}-{s}, q free: {q._value}")
+        metrics.finish(submitted, started)
+    logger.debug(f"- worker {b}-{s}, in flight: {metrics.in_flight}")
     return d
 
-async def dispatcher(qmax, n_batches, n_steps, dur): 
+async def dispatcher(qmax, n_batches, n_steps, dur, metrics=None): 
     queue = asyncio.Semaphore(qmax)
+    metrics = metrics or Metrics('dispatcher')
     logger.info(f"job dispatched")
     results = []
-    for b in range(n_batches): 
-        logger.info(f"++ batch {b}, queue open: {queue._value}") 
-        tasks = []
-        for s in range(n_steps): 
-            tasks.append(asyncio.create_task(worker(queue, b, s, dur)))
-        await asyncio.gather(*tasks)
-        results.append(b)
-        logger.info(f"-- batch {b}") 
-        await asyncio.sleep(0.5) 
+    async with SnapshotWriter([metrics], config_metrics_file, config_metrics_interval):
+        for b in range(n_batches): 
+            logger.info(f"++ batch {b}, in flight: {metrics.in_flight}") 
+            tasks = []
+            for s in range(n_steps): 
+                tasks.append(asyncio.create_task(worker(queue, b, s, dur, metrics)))
+            await asyncio.gather(*tasks)
+            results.append(b)
+            logger.info(f"-- batch {b}") 
+            await asyncio.sleep(0.5) 
     logger.info(f"finished all batches") 
     return results
 
@@ -58,9 +67,12 @@ def job():
     logger.info(f"starting job, worst-case {seq_max} seconds") 
     logger.info(f"estimated {q_eta} seconds with async queue") 
     jstart = time.time()
-    out = asyncio.run(dispatcher(qmax, n_batches, n_steps, dur))
+    metrics = Metrics('dispatcher')
+    out = asyncio.run(dispatcher(qmax, n_batches, n_steps, dur, metrics))
     jdur = round(time.time() - jstart, ndigits=1)
     logger.info(f'finished job in {jdur}s; overhead {round(jdur - q_eta, ndigits=1)}')
+    # the ETA model: service is dur, and the k-th wave of a batch waits k * dur for a slot
+    logger.info(f"expected wait max {dur * (math.ceil(n_steps/qmax) - 1)}s, service {dur}s; observed {metrics.percentiles(2)}")
     return out 
 
 
@@ -98,10 +110,184 @@ def seq_job():
     return out 
 
 
-run = job() 
-seq_run = seq_job()
+##### adaptive concurrency
+
+class AdaptiveLimiter():
+    """
+    concurrency limit tuned from observed latency and errors (AIMD)
+    - additive increase: each success under the latency target adds 1/limit, so about +1 per limit's worth of requests
+    - multiplicative decrease: an error, or latency above tolerance x the best latency seen, scales the limit by backoff,
+      at most once per round trip (only requests started after the last decrease can trigger another)
+    """
+    def __init__(self, initial=3, min_limit=1, max_limit=256, backoff=0.7, tolerance=2.0):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.in_flight = 0
+        self.min_latency = None
+        self.last_decrease = 0.0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self) -> float:
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        return time.perf_counter()
+
+    async def release(self, started, ok=True):
+        latency = time.perf_counter() - started
+        async with self._cond:
+            self.in_flight -= 1
+            if ok:
+                self.min_latency = latency if self.min_latency is None else min(self.min_latency, latency)
+            slow = ok and latency > self.tolerance * self.min_latency
+            if (not ok or slow) and started > self.last_decrease:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self.last_decrease = time.perf_counter()
+            elif ok and not slow:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def slot(self):
+        return _LimiterSlot(self)
+
+
+class _LimiterSlot():
+    def __init__(self, limiter):
+        self.limiter = limiter
+
+    async def __aenter__(self):
+        self.started = await self.limiter.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.limiter.release(self.started, ok=exc_type is None)
+
+
+class ServiceBusy(Exception):
+    pass
+
+
+class MockService():
+    """
+    local stand-in for a rate-sensitive service: `capacity` requests are served in parallel at `latency` seconds each,
+    up to `max_queue` more wait their turn (so latency climbs), anything beyond that is rejected with ServiceBusy
+    """
+    def __init__(self, capacity=8, latency=0.1, max_queue=8, error_rate=0.0):
+        self.capacity = capacity
+        self.latency = latency
+        self.max_queue = max_queue
+        self.error_rate = error_rate
+        self.waiting = 0
+        self.served = 0
+        self.rejected = 0
+        self._slots = asyncio.Semaphore(capacity)
+
+    async def request(self, payload=None):
+        if self.waiting >= self.capacity + self.max_queue:
+            self.rejected += 1
+            raise ServiceBusy('service busy')
+        self.waiting += 1
+        try:
+            async with self._slots:
+                await asyncio.sleep(self.latency * (1 + 0.2 * noise_fn()))
+                if urand() < self.error_rate:
+                    raise ServiceBusy('service error')
+                self.served += 1
+                return payload
+        finally:
+            self.waiting -= 1
+
+
+async def flow_worker(limiter, service, s, metrics, max_attempts=5):
+    # queue wait runs until the first slot; service time covers every attempt, backoff included
+    submitted, started = metrics.submit(), None
+    for attempt in range(1, max_attempts + 1):
+        try:
+            async with limiter.slot():
+                started = started or metrics.start(submitted)
+                out = await service.request(s)
+            metrics.finish(submitted, started)
+            return out
+        except ServiceBusy:
+            if attempt == max_attempts:
+                if started:
+                    metrics.finish(submitted, started, ok=False)
+                raise
+            await asyncio.sleep(0.01 * 2 ** attempt)
+
+
+async def flow_dispatcher(limiter, service, n_tasks, metrics=None):
+    """
+    continuous flow: every task is started up front and waits only for a slot from the limiter,
+    so a slow request holds up its own slot rather than a whole batch
+    """
+    metrics = metrics or Metrics('flow')
+    logger.info(f"flow job dispatched, {n_tasks} tasks")
+    async with SnapshotWriter([metrics], config_metrics_file, config_metrics_interval):
+        tasks = [asyncio.create_task(flow_worker(limiter, service, s, metrics)) for s in range(n_tasks)]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def batch_dispatcher(service, qmax, n_batches, n_steps, pause, metrics=None):
+    # the original batch barriers (fixed semaphore, gather per batch, then a pause) against the mock service
+    sem = asyncio.Semaphore(qmax)
+    metrics = metrics or Metrics('batch')
+    async def call(s):
+        submitted = metrics.submit()
+        async with sem:
+            started = metrics.start(submitted)
+            try:
+                out = await service.request(s)
+            except ServiceBusy:
+                metrics.finish(submitted, started, ok=False)
+                raise
+            metrics.finish(submitted, started)
+            return out
+    results = []
+    async with SnapshotWriter([metrics], config_metrics_file, config_metrics_interval):
+        for b in range(n_batches):
+            results += await asyncio.gather(*[call(s) for s in range(n_steps)], return_exceptions=True)
+            await asyncio.sleep(pause)
+    return results
+
 
+def bench(scale=0.05, capacity=12, n_batches=config_n_batches, n_steps=config_n_steps, qmax=config_qmax):
+    """
+    time each dispatch mode against the mock service, with durations scaled down by `scale`,
+    next to the seq_job() and job() ETA formulas at the same scale
+    """
+    dur, pause = config_dur * scale, 0.5 * scale
+    n_tasks = n_batches * n_steps
+    seq_max = (dur * n_steps + pause) * n_batches
+    q_eta = (dur * math.ceil(n_steps/qmax) + pause) * n_batches
+    modes = dict(
+        batch=lambda svc, m: batch_dispatcher(svc, qmax, n_batches, n_steps, pause, m),
+        flow_fixed=lambda svc, m: flow_dispatcher(AdaptiveLimiter(qmax, min_limit=qmax, max_limit=qmax), svc, n_tasks, m),
+        flow_adaptive=lambda svc, m: flow_dispatcher(AdaptiveLimiter(qmax), svc, n_tasks, m),
+    )
+    rows = [dict(mode='seq_job ETA', seconds=round(seq_max, 3)), dict(mode='job ETA', seconds=round(q_eta, 3))]
+    for mode, run in modes.items():
+        metrics = Metrics(mode)
+        async def timed():
+            svc = MockService(capacity=capacity, latency=dur)
+            start = time.perf_counter()
+            out = await run(svc, metrics)
+            errors = sum(isinstance(r, Exception) for r in out)
+            return time.perf_counter() - start, svc, errors
+        elapsed, svc, errors = asyncio.run(timed())
+        rows.append(dict(mode=mode, seconds=round(elapsed, 3), vs_job_eta=round(elapsed / q_eta, 2),
+                         served=svc.served, rejected=svc.rejected, errors=errors, **metrics.percentiles()))
+    for row in rows:
+        logger.info(row)
+    return rows
 
-run
-seq_run
 
+if __name__ == '__main__':
+    if 'bench' in sys.argv[1:]:
+        bench()
+    else:
+        run = job() 
+        seq_run = seq_job()